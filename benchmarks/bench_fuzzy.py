@@ -0,0 +1,62 @@
+# Compares the per-post fuzz.partial_ratio path with website.fuzzy.partial_ratio_cdist
+# Run from the repository root:
+# python -m benchmarks.bench_fuzzy
+import random
+import time
+
+from fuzzywuzzy import fuzz
+
+from website.fuzzy import partial_ratio_cdist
+
+WORDS = [
+	'First', 'Contact', 'Chapter', 'Part', 'The', 'Nature', 'of', 'Predators', 'Sexy', 'Space', 'Babes',
+	'Humans', 'are', 'Weird', 'Deathworlders', 'Book', 'One', 'Two', 'Interlude', 'Epilogue', 'Serial',
+	'[OC]', 'Tales', 'From', 'the', 'Terran', 'Republic', 'Hunter', 'or', 'Huntress', 'Galactic', 'War',
+]
+
+
+def make_title(rng):
+	return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))) + f' {rng.randint(1, 300)}'
+
+
+def per_post(titles, fragments, cutoffs):
+	return [
+		[fuzz.partial_ratio(fragment, title) >= cutoff for fragment, cutoff in zip(fragments, cutoffs)]
+		for title in titles
+	]
+
+
+def batched(titles, fragments, cutoffs):
+	return [
+		[score >= cutoff for score, cutoff in zip(row, cutoffs)]
+		for row in partial_ratio_cdist(titles, fragments, cutoffs)
+	]
+
+
+def main():
+	rng = random.Random(1337)
+
+	titles = [make_title(rng) for _ in range(2000)]
+	fragments = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) for _ in range(8)]
+	cutoffs = [80] * len(fragments)
+
+	start = time.perf_counter()
+	expected = per_post(titles, fragments, cutoffs)
+	per_post_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	got = batched(titles, fragments, cutoffs)
+	batched_time = time.perf_counter() - start
+
+	if got != expected:
+		raise AssertionError('partial_ratio_cdist made a different decision than fuzz.partial_ratio')
+
+	pairs = len(titles) * len(fragments)
+	print(f'{len(titles)} titles x {len(fragments)} fragments, decisions identical')
+	print(f'fuzz.partial_ratio per post: {per_post_time:.2f}s ({pairs / per_post_time:.0f} pairs/s)')
+	print(f'partial_ratio_cdist:         {batched_time:.2f}s ({pairs / batched_time:.0f} pairs/s)')
+	print(f'speedup: {per_post_time / batched_time:.1f}x')
+
+
+if __name__ == '__main__':
+	main()
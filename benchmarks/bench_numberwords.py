@@ -0,0 +1,98 @@
+# Compares the nltk tagger + chunker that replaceTextnumberWithNumber used to be with website.numberwords
+# Run from the repository root:
+# python -m benchmarks.bench_numberwords
+import random
+import re
+import time
+
+import nltk
+from word2number import w2n
+
+from website.numberwords import replace_number_words
+
+WORDS = [
+	'First', 'Contact', 'Chapter', 'Part', 'The', 'Nature', 'of', 'Predators', 'Book', 'Interlude', 'Epilogue',
+	'[OC]', 'Tales', 'From', 'the', 'Terran', 'Republic', '-', '--', ':', '(Part', 'Two)', 'someone', 'often',
+	'One', 'Two', 'Three', 'Seven', 'Seventeen', 'Twenty', 'Forty-Two', 'Hundred', 'Thousand', 'Ninety', 'Zero',
+	'Don\'t', 'Mr.', '"Home"', 'End.', 'Final?', 'Wait!',
+]
+
+
+# The implementation before website.numberwords, builds a tagger and a parser on every call
+def legacy(text):
+	if len(text) > 10 and 'Seven Days of Fire' in text:
+		return text
+
+	tagged_number_words = 'ten/CD thousand/CD nine/CD hundred/CD ninety/CD eight/CD seven/CD six/CD five/CD four/CD three/CD two/CD one/CD eighty/CD seventy/CD sixty/CD fifty/CD forty/CD thirty/CD twenty/CD nineteen/CD eighteen/CD seventeen/CD sixteen/CD fifteen/CD fourteen/CD thirteen/CD twelve/CD eleven/CD zero/CD'
+	tagged_number_words_tuples = [nltk.tag.str2tuple(t) for t in tagged_number_words.split()]
+	my_tagger = nltk.UnigramTagger([ tagged_number_words_tuples ], backoff=nltk.DefaultTagger('IGNORE'))
+
+	my_grammar = 'NumberWord: {<CD>+}'
+	parser = nltk.RegexpParser(my_grammar)
+	parsed = parser.parse(my_tagger.tag(nltk.word_tokenize(text.lower())))
+
+	for tag in [tree.leaves() for tree in parsed.subtrees() if tree.label() == 'NumberWord']:
+		ut = nltk.untag(tag)
+		num = w2n.word_to_num(' '.join(ut))
+
+		r = re.compile(re.escape(' '.join(ut)), re.IGNORECASE)
+		text = r.sub(str(num), text)
+
+	return text
+
+
+def make_title(rng):
+	return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))) + f' {rng.randint(1, 300)}'
+
+
+# word2number raises on some runs of words ('thousand three hundred'), the old implementation did too
+def outcome(fn, title):
+	try:
+		return fn(title)
+	except (ValueError, IndexError) as e:
+		return type(e)
+
+
+def timed(fn, titles):
+	start = time.perf_counter()
+	result = [outcome(fn, title) for title in titles]
+
+	return result, time.perf_counter() - start
+
+
+def main():
+	rng = random.Random(1337)
+
+	with open('website/test_helpers.table') as f:
+		table = [line.split(';')[0].strip() for line in f if line.strip() != '']
+
+	titles = table + [make_title(rng) for _ in range(2000)]
+
+	try:
+		legacy('one')
+	except LookupError:
+		# word_tokenize needs the punkt data: python -m nltk.downloader punkt_tab
+		print('nltk punkt data is missing, can not run the old implementation')
+		return
+
+	expected, legacy_time = timed(legacy, titles)
+
+	replace_number_words.cache_clear()
+	got, uncached_time = timed(replace_number_words.__wrapped__, titles)
+
+	if got != expected:
+		raise AssertionError('replace_number_words gave a different result than the old implementation')
+
+	# Every title a second time, like the listing of a story rendering its posts again
+	timed(replace_number_words, titles)
+	_, cached_time = timed(replace_number_words, titles)
+
+	print(f'{len(titles)} titles, results identical')
+	print(f'nltk tagger + chunker:        {legacy_time:.2f}s ({len(titles) / legacy_time:.0f} titles/s)')
+	print(f'replace_number_words:         {uncached_time:.2f}s ({len(titles) / uncached_time:.0f} titles/s)')
+	print(f'replace_number_words, cached: {cached_time:.4f}s ({len(titles) / cached_time:.0f} titles/s)')
+	print(f'speedup: {legacy_time / uncached_time:.1f}x uncached')
+
+
+if __name__ == '__main__':
+	main()
@@ -48,6 +48,7 @@ MIDDLEWARE = [
 	'django.middleware.clickjacking.XFrameOptionsMiddleware',
 	'csp.middleware.CSPMiddleware',
 	'website.middleware.Headers',
+	'website.middleware.RedditBudget',
 ]
 
 ROOT_URLCONF = 'redditSub2Kindle.urls'
@@ -81,16 +82,58 @@ DATABASES = {
 	}
 }
 
+# One SQLite file instead of one file per cache entry, see website/cache_backend.py
 CACHES = {
 	'default': {
-		'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-		'LOCATION': 'django_cache',
+		'BACKEND': 'website.cache_backend.SQLiteCache',
+		'LOCATION': BASE_DIR / 'django_cache.sqlite3',
 		'OPTIONS': {
-			'MAX_ENTRIES': 1000000000
+			'MAX_ENTRIES': 1000000,
+			'MAX_SIZE': 2 * 1024 * 1024 * 1024,
+			'CULL_FREQUENCY': 10,
 		}
 	}
 }
 
+# Every process also keeps recently used posts in memory in front of CACHES, limited by count and bytes
+POST_CACHE_LOCAL_ENTRIES = 10000
+POST_CACHE_LOCAL_BYTES = 64 * 1024 * 1024
+
+# How many authors /all fetches from reddit at the same time, and how long (in seconds) the page waits
+# for all of them together before it gives up on the ones that aren't done
+REDDIT_FETCH_WORKERS = 8
+REDDIT_FETCH_TIMEOUT = 20
+
+# How many connections to reddit every process keeps open, at least one per fetching thread
+REDDIT_POOL_SIZE = 10
+
+# Stored posts younger than the soft TTL (in seconds) are shown as they are, until the hard TTL
+# they are shown while being synced in the background, older ones are synced before the page loads
+LISTING_SOFT_TTL = 5 * 60
+LISTING_HARD_TTL = 60 * 60
+
+# 'author' syncs every author on its own, 'subreddit' reads each followed subreddit once for all its authors
+# (authors are then only synced on their own to backfill them), see crawler.sync_subreddit()
+REDDIT_SYNC_MODE = 'author'
+
+# An author whose sync fails is not synced again for this many seconds, doubling with every failure in a row
+AUTHOR_BACKOFF = 60
+AUTHOR_BACKOFF_MAX = 24 * 60 * 60
+
+# All workers and crawlers together send at most this many requests to reddit a minute (fewer when
+# reddit's rate limit headers say so), background work leaves this share of every minute to page loads
+REDDIT_REQUESTS_PER_MINUTE = 100
+REDDIT_INTERACTIVE_SHARE = 0.25
+# Page loads wait at most this many seconds for the budget, then show what is stored or answer 503
+REDDIT_INTERACTIVE_WAIT = 2
+
+# Calibre's ebook-convert, at most EBOOK_CONVERT_WORKERS (None is one per core) run at once with EBOOK_CONVERT_QUEUE
+# more waiting, any more get a 503, a book that isn't converted within EBOOK_CONVERT_TIMEOUT seconds fails
+EBOOK_CONVERT_PATH = r'C:\Program Files\Calibre2\ebook-convert.exe'
+EBOOK_CONVERT_WORKERS = None
+EBOOK_CONVERT_QUEUE = 10
+EBOOK_CONVERT_TIMEOUT = 120
+
 
 #import logging
 
@@ -3,7 +3,7 @@ from django.contrib import admin
 # Register your models here.
 from django.contrib import admin
 
-from .models import Author, Story
+from .models import Author, Story, TitleRule
 
 class AuthorAdmin(admin.ModelAdmin):
 	list_display = ('username', 'enabled')
@@ -14,3 +14,9 @@ class StoryAdmin(admin.ModelAdmin):
 	list_display = ('author', 'subreddit', 'title_fragment', 'is_regex', 'enabled')
 
 admin.site.register(Story, StoryAdmin)
+
+class TitleRuleAdmin(admin.ModelAdmin):
+	list_display = ('position', 'kind', 'author', 'subreddit', 'condition', 'pattern', 'replacement', 'enabled')
+	list_editable = ('enabled',)
+
+admin.site.register(TitleRule, TitleRuleAdmin)
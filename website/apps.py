@@ -2,3 +2,7 @@ from django.apps import AppConfig
 
 class WebsiteConfig(AppConfig):
     name = 'website'
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        from . import signals
@@ -0,0 +1,290 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+# The tables, indexes and triggers, see _create_schema()
+SCHEMA = [
+	'CREATE TABLE IF NOT EXISTS cache ('
+	'	key TEXT PRIMARY KEY,'
+	'	value BLOB NOT NULL,'
+	'	expires REAL,'
+	'	accessed REAL NOT NULL,'
+	'	size INTEGER NOT NULL'
+	')',
+	'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+	'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+	# One row, the number of entries and the sum of their sizes
+	'CREATE TABLE IF NOT EXISTS cache_stats ('
+	'	id INTEGER PRIMARY KEY CHECK (id = 0),'
+	'	entries INTEGER NOT NULL,'
+	'	size INTEGER NOT NULL'
+	')',
+	'CREATE TRIGGER IF NOT EXISTS cache_inserted AFTER INSERT ON cache BEGIN'
+	'	UPDATE cache_stats SET entries = entries + 1, size = size + new.size;'
+	' END',
+	'CREATE TRIGGER IF NOT EXISTS cache_deleted AFTER DELETE ON cache BEGIN'
+	'	UPDATE cache_stats SET entries = entries - 1, size = size - old.size;'
+	' END',
+	'CREATE TRIGGER IF NOT EXISTS cache_updated AFTER UPDATE OF size ON cache BEGIN'
+	'	UPDATE cache_stats SET size = size + new.size - old.size;'
+	' END',
+]
+
+
+# A cache backend that keeps every entry in one SQLite database (in WAL mode) instead of one file per entry
+#
+# CACHES = {
+# 	'default': {
+# 		'BACKEND': 'website.cache_backend.SQLiteCache',
+# 		'LOCATION': 'django_cache.sqlite3',
+# 		'OPTIONS': {
+# 			'MAX_ENTRIES': 1000000,            # least recently used entries are evicted above this
+# 			'MAX_SIZE': 2 * 1024 * 1024 * 1024,  # bytes, optional
+# 			'CULL_FREQUENCY': 10,              # evict 1/10th of the entries at a time
+# 		}
+# 	}
+# }
+#
+# Expired entries are found through an index, and triggers keep a running count and byte total of the entries
+# in the same transaction as every write, so deciding whether to evict never has to look at every entry
+# Integers are stored as plain SQLite integers, which is what makes incr()/decr() atomic
+class SQLiteCache(BaseCache):
+	# Dropping expired entries is a write, so it (and checking whether we have to evict) is only done every this many writes
+	CULL_EVERY = 100
+
+	# get() only refreshes an entry's "last used" time when it's older than this, so reads rarely write
+	TOUCH_GRANULARITY = 60
+
+	def __init__(self, location, params):
+		super().__init__(params)
+
+		self.path = os.fspath(location)
+		self.max_size = params.get('OPTIONS', {}).get('MAX_SIZE')
+
+		self.local = threading.local()
+		self.writes = 0
+		self.schema_lock = threading.Lock()
+		self.schema_ready = False
+
+	@property
+	def connection(self):
+		connection = getattr(self.local, 'connection', None)
+
+		if connection is None:
+			connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+			connection.execute('PRAGMA journal_mode=WAL')
+			connection.execute('PRAGMA synchronous=NORMAL')
+			self.local.connection = connection
+			self._create_schema(connection)
+
+		return connection
+
+	def _create_schema(self, connection):
+		with self.schema_lock:
+			if self.schema_ready:
+				return
+
+			connection.execute('BEGIN IMMEDIATE')
+
+			try:
+				# One statement at a time, executescript() would commit the transaction first
+				for statement in SCHEMA:
+					connection.execute(statement)
+
+				# Counted once, when the table is new or was made before there were running totals
+				if connection.execute('SELECT 1 FROM cache_stats').fetchone() is None:
+					connection.execute('INSERT INTO cache_stats SELECT 0, COUNT(*), TOTAL(size) FROM cache')
+
+				connection.execute('COMMIT')
+			except BaseException:
+				connection.execute('ROLLBACK')
+				raise
+
+			self.schema_ready = True
+
+	def _key(self, key, version):
+		key = self.make_key(key, version=version)
+		self.validate_key(key)
+		return key
+
+	@staticmethod
+	def _encode(value):
+		# type() and not isinstance(), bools have to be pickled to come back as bools
+		if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+			return value
+
+		return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+	@staticmethod
+	def _decode(value):
+		if isinstance(value, int):
+			return value
+
+		return pickle.loads(value)
+
+	@staticmethod
+	def _size(key, value):
+		return len(key) + (8 if isinstance(value, int) else len(value))
+
+	def _rows(self, key, value, timeout, now):
+		encoded = self._encode(value)
+		return key, encoded, self.get_backend_timeout(timeout), now, self._size(key, encoded)
+
+	def get(self, key, default=None, version=None):
+		return self.get_many([key], version=version).get(key, default)
+
+	def get_many(self, keys, version=None):
+		keys = list(keys)
+		made = {self._key(key, version): key for key in keys}
+
+		if len(made) == 0:
+			return {}
+
+		now = time.time()
+		found = {}
+		stale = []
+
+		# SQLite limits how many parameters a query can have
+		made_keys = list(made)
+		for i in range(0, len(made_keys), 500):
+			chunk = made_keys[i:i + 500]
+			rows = self.connection.execute(
+				f'SELECT key, value, accessed FROM cache WHERE key IN ({",".join("?" * len(chunk))}) AND (expires IS NULL OR expires > ?)',
+				(*chunk, now)
+			).fetchall()
+
+			for key, value, accessed in rows:
+				found[made[key]] = self._decode(value)
+
+				if accessed < now - self.TOUCH_GRANULARITY:
+					stale.append(key)
+
+		if len(stale) > 0:
+			self.connection.executemany('UPDATE cache SET accessed = ? WHERE key = ?', [(now, key) for key in stale])
+
+		return found
+
+	def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		self.set_many({key: value}, timeout=timeout, version=version)
+
+	def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+		now = time.time()
+		rows = [self._rows(self._key(key, version), value, timeout, now) for key, value in data.items()]
+
+		with self.connection:
+			self.connection.execute('BEGIN IMMEDIATE')
+			# An upsert and not INSERT OR REPLACE, whose implicit delete wouldn't fire the cache_deleted trigger
+			self.connection.executemany(
+				'INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+				'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, accessed = excluded.accessed, size = excluded.size',
+				rows
+			)
+
+		self._maybe_cull(len(rows))
+
+		return []
+
+	def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		now = time.time()
+
+		# Only overwrites an existing entry when it has expired
+		cursor = self.connection.execute(
+			'INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+			'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, accessed = excluded.accessed, size = excluded.size '
+			'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+			(*self._rows(self._key(key, version), value, timeout, now), now)
+		)
+
+		self._maybe_cull(1)
+
+		return cursor.rowcount == 1
+
+	def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+		now = time.time()
+		cursor = self.connection.execute(
+			'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+			(self.get_backend_timeout(timeout), now, self._key(key, version), now)
+		)
+
+		return cursor.rowcount == 1
+
+	def incr(self, key, delta=1, version=None):
+		key = self._key(key, version)
+
+		with self.connection:
+			self.connection.execute('BEGIN IMMEDIATE')
+			cursor = self.connection.execute(
+				"UPDATE cache SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?)",
+				(delta, key, time.time())
+			)
+
+			if cursor.rowcount == 0:
+				raise ValueError(f"Key '{key}' not found, or not an integer")
+
+			return self.connection.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()[0]
+
+	def delete(self, key, version=None):
+		return self.delete_many([key], version=version) > 0
+
+	def delete_many(self, keys, version=None):
+		keys = [self._key(key, version) for key in keys]
+		deleted = 0
+
+		for i in range(0, len(keys), 500):
+			chunk = keys[i:i + 500]
+			deleted += self.connection.execute(f'DELETE FROM cache WHERE key IN ({",".join("?" * len(chunk))})', chunk).rowcount
+
+		return deleted
+
+	def has_key(self, key, version=None):
+		return self.connection.execute(
+			'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+			(self._key(key, version), time.time())
+		).fetchone() is not None
+
+	def clear(self):
+		self.connection.execute('DELETE FROM cache')
+
+	def _maybe_cull(self, written):
+		self.writes += written
+
+		if self.writes < self.CULL_EVERY:
+			return
+
+		self.writes = 0
+		self.cull()
+
+	# Drops expired entries, then the least recently used ones while we are over MAX_ENTRIES or MAX_SIZE
+	def cull(self):
+		connection = self.connection
+		connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+
+		def too_big():
+			count, size = connection.execute('SELECT entries, size FROM cache_stats').fetchone()
+
+			if count > self._max_entries or (self.max_size is not None and size > self.max_size):
+				return count
+
+			return 0
+
+		count = too_big()
+
+		if count == 0:
+			return
+
+		if self._cull_frequency == 0:
+			# Same as django's own backends, a frequency of 0 means "empty the whole cache"
+			self.clear()
+			return
+
+		# Evicting in chunks of 1/CULL_FREQUENCY of the entries, like django's backends do
+		chunk = max(count // self._cull_frequency, 1)
+
+		while count > 0:
+			connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)', (chunk,))
+			count = too_big()
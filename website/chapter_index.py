@@ -0,0 +1,178 @@
+import bisect
+
+from django.db.models import Count, Max, Q
+
+from .helpers import FIRST_CONTACT_REGEX, LRUCache, chapter_numbers, chunks, has_current_titles, \
+	parse_chapter_number, standardize_title
+from .matching import get_multi_story_matcher, story_revision
+from .title_rules import pipeline_for
+
+# Indexes by (story, story revision, stored posts revision, title rules version), only a sync that stored
+# posts or an edited story makes a new index, old ones fall out of the cache
+_indexes = LRUCache(100)
+
+
+# The most chapters in a row that can be missing, see ChapterIndex.gaps()
+MAX_GAP = 100
+
+
+# The chapter number of a post that has its fixed_title, found the same way the ebook name is,
+# see get_ebook_name_from_list_of_posts(), None when the title has no (usable) number
+def chapter_number(post):
+	fc = FIRST_CONTACT_REGEX.match(post.fixed_title)
+
+	if fc is not None:
+		return int(fc.group(2)) if fc.group(2) is not None else None
+
+	numbers = chapter_numbers(post)
+
+	if len(numbers) == 0:
+		return None
+
+	# Too many numbers, use the last one
+	try:
+		return parse_chapter_number(numbers[-1])
+	except ValueError:
+		return None
+
+
+# The posts of one story, oldest first, looked up by time and by chapter number
+# "The next 10 unread" and "chapters 40 to 60" are slices, no walking the whole history
+#
+# Example:
+# index = get_chapter_index(story)
+# index.next_unread(10, newest_read(story, index))
+# index.chapters(40, 60)
+class ChapterIndex:
+	def __init__(self, posts):
+		self.posts = sorted(posts, key=lambda post: post.created_utc)
+		self.times = [post.created_utc for post in self.posts]
+		self.ids = {post.id for post in self.posts}
+		self.numbers = [chapter_number(post) for post in self.posts]
+
+		# (number, time) order, with the position of the post in self.posts
+		numbered = sorted(
+			(number, post.created_utc, position)
+			for position, (post, number) in enumerate(zip(self.posts, self.numbers)) if number is not None
+		)
+		self.sorted_numbers = [number for number, _, _ in numbered]
+		self.number_positions = [position for _, _, position in numbered]
+
+	def __len__(self):
+		return len(self.posts)
+
+	# The oldest `n` posts after the newest read one, what get_reddit_posts(author, story, 0)[-n:] gave
+	# `newest_read` is the created_utc of the newest read post, see newest_read()
+	def next_unread(self, n, newest_read):
+		start = 0 if newest_read is None else bisect.bisect_right(self.times, newest_read)
+
+		return self.posts[start:start + n]
+
+	# Every post numbered `first` to `last` (inclusive), oldest first
+	def chapters(self, first, last):
+		lo = bisect.bisect_left(self.sorted_numbers, first)
+		hi = bisect.bisect_right(self.sorted_numbers, last)
+
+		return [self.posts[position] for position in sorted(self.number_positions[lo:hi])]
+
+	# Runs of whole chapter numbers missing between the lowest and the highest one, as (first, last) pairs
+	# A jump of more than MAX_GAP isn't missing chapters but a number that isn't one, like a year in a title
+	def gaps(self):
+		whole = sorted({number for number in self.sorted_numbers if isinstance(number, int)})
+
+		return [(a + 1, b - 1) for a, b in zip(whole, whole[1:]) if 1 < b - a <= MAX_GAP + 1]
+
+	# Chapter numbers that more than one post has, with those posts oldest first
+	def duplicates(self):
+		found = {}
+
+		for number, position in zip(self.sorted_numbers, self.number_positions):
+			found.setdefault(number, []).append(self.posts[position])
+
+		return {number: posts for number, posts in found.items() if len(posts) > 1}
+
+
+# gaps() for people, like ['3', '7-9'], only the first `limit` runs and then how many more there are
+def describe_gaps(gaps, limit=10):
+	described = [str(first) if first == last else f'{first}-{last}' for first, last in gaps[:limit]]
+
+	if len(gaps) > limit:
+		described.append(f'{len(gaps) - limit} more')
+
+	return described
+
+
+# Models are imported where they're used, so ChapterIndex works without django settings (the unit tests)
+def _story_posts(story):
+	from .models import Post
+
+	return Post.objects.filter(author=story.author, subreddit__iexact=story.subreddit)
+
+
+# Changes whenever a sync stores (new or changed) posts for the story, or posts are deleted, one query
+# A sync that found nothing new leaves it alone, so the index isn't rebuilt every LISTING_SOFT_TTL
+def _posts_revision(story):
+	revision = _story_posts(story).aggregate(fetched_at=Max('fetched_at'), count=Count('id'))
+
+	return revision['fetched_at'], revision['count']
+
+
+def _build(story):
+	posts = [post for post in _story_posts(story).select_related('author') if post.removed_by_category is None]
+	matched = get_multi_story_matcher([story]).match_page(posts)
+	posts = [post for post, stories in zip(posts, matched) if len(stories) > 0]
+
+	for post in posts:
+		if not has_current_titles(post):
+			post.fixed_title = standardize_title(post)
+
+	return ChapterIndex(posts)
+
+
+# The chapter index of a story, built from the local post store
+# The author is synced first like get_reddit_posts(), pass refresh=False when that was just done
+def get_chapter_index(story, refresh=True):
+	from .crawler import refresh_author
+
+	author = story.author
+
+	if refresh:
+		refresh_author(author)
+
+	key = (story.pk, story_revision(story), _posts_revision(story), pipeline_for(author.username, story.subreddit).version)
+	index = _indexes.get(key)
+
+	if index is None:
+		index = _build(story)
+		_indexes.set(key, index)
+
+	return index
+
+
+# When the newest read (upvoted or hidden) post of the story was made, None when nothing was read
+# Other stories in the same subreddit can have read posts too, those are skipped
+def newest_read(story, index):
+	read = _story_posts(story).filter(Q(likes=True) | Q(hidden=True)).order_by('-created_utc')
+
+	for post_id, created_utc in read.values_list('id', 'created_utc').iterator(chunk_size=100):
+		if post_id in index.ids:
+			return created_utc
+
+	return None
+
+
+# Gives `posts` (from an index, so possibly old) their current votes and read state
+def attach_read_state(posts):
+	from .models import Post
+
+	for chunk in chunks(posts, 500):
+		state = {
+			post_id: (likes, hidden)
+			for post_id, likes, hidden in Post.objects.filter(id__in=[post.id for post in chunk]).values_list('id', 'likes', 'hidden')
+		}
+
+		for post in chunk:
+			post.likes, post.hidden = state.get(post.id, (post.likes, post.hidden))
+			post.is_read = post.likes is True or post.hidden
+
+	return posts
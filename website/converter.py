@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, PIPE, TimeoutExpired
+
+from django.conf import settings
+
+# Calibre's ebook-convert is slow to start and uses a whole core while it runs, so conversions go through
+# a pool of EBOOK_CONVERT_WORKERS threads (one per core by default) that each run one ebook-convert at a time
+# At most EBOOK_CONVERT_QUEUE more conversions wait for a worker, anything past that fails right away,
+# and every conversion, waiting included, has to be done within EBOOK_CONVERT_TIMEOUT seconds
+#
+# Example:
+# get_converter().convert('book.epub', 'book.azw3')
+
+# The stages of turning a book into a download, get_converter_stats() reports how long each took
+STAGES = ('write', 'queue', 'convert', 'read')
+
+
+# Every worker is busy and the queue is full
+class ConverterBusy(Exception):
+	pass
+
+
+class ConversionService:
+	def __init__(self, path, workers, max_queue, timeout):
+		self.path = path
+		self.workers = workers
+		self.max_queue = max_queue
+		self.timeout = timeout
+
+		self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ebook-convert')
+		self.slots = threading.BoundedSemaphore(workers + max_queue)
+
+		self.lock = threading.Lock()
+		self.queued = 0
+		self.running = 0
+		self.rejected = 0
+		self.timings = {stage: deque(maxlen=100) for stage in STAGES}
+
+	def record(self, stage, seconds):
+		with self.lock:
+			self.timings[stage].append(seconds)
+
+	# Converts `source` into `target` (the format comes from its extension), blocks until it's done
+	def convert(self, source, target):
+		if not self.slots.acquire(blocking=False):
+			with self.lock:
+				self.rejected += 1
+
+			raise ConverterBusy(f'{self.workers} conversions running and {self.max_queue} waiting')
+
+		with self.lock:
+			self.queued += 1
+
+		try:
+			return self.executor.submit(self._run, source, target, time.monotonic()).result()
+		finally:
+			self.slots.release()
+
+	def _run(self, source, target, submitted):
+		started = time.monotonic()
+		deadline = submitted + self.timeout
+
+		with self.lock:
+			self.queued -= 1
+			self.running += 1
+
+		self.record('queue', started - submitted)
+
+		try:
+			if started >= deadline:
+				raise TimeoutError(f'ebook-convert waited more than {self.timeout}s for a worker')
+
+			process = Popen([ self.path, source, target ], stdout=PIPE, stderr=PIPE)
+
+			try:
+				stdout, stderr = process.communicate(timeout=deadline - started)
+			except TimeoutExpired:
+				process.kill()
+				process.communicate()
+				raise TimeoutError(f'ebook-convert took more than {self.timeout}s')
+
+			if process.returncode != 0 or len(stderr) > 0:
+				raise BrokenPipeError(f'ebook-convert: {stderr.decode("utf-8")}')
+
+			return stdout
+		finally:
+			self.record('convert', time.monotonic() - started)
+
+			with self.lock:
+				self.running -= 1
+
+	def stats(self):
+		with self.lock:
+			return {
+				'workers': self.workers,
+				'running': self.running,
+				'queued': self.queued,
+				'max_queue': self.max_queue,
+				'rejected': self.rejected,
+				# Seconds, over the last 100 books
+				'timings': {
+					stage: {
+						'count': len(times),
+						'avg': sum(times) / len(times) if len(times) > 0 else None,
+						'max': max(times, default=None),
+					}
+					for stage, times in self.timings.items()
+				},
+			}
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_converter():
+	global _converter
+
+	with _converter_lock:
+		if _converter is None:
+			_converter = ConversionService(
+				getattr(settings, 'EBOOK_CONVERT_PATH', 'ebook-convert'),
+				getattr(settings, 'EBOOK_CONVERT_WORKERS', None) or os.cpu_count() or 1,
+				getattr(settings, 'EBOOK_CONVERT_QUEUE', 10),
+				getattr(settings, 'EBOOK_CONVERT_TIMEOUT', 120),
+			)
+
+		return _converter
+
+
+def get_converter_stats():
+	return get_converter().stats()
@@ -0,0 +1,492 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.termcolors import colorize
+
+from prawcore.exceptions import PrawcoreException
+
+from . import rate_limit, singleflight
+from .helpers import TITLE_FIELDS, advance_high_water_marks, chunks, lower_high_water_marks, split_covered, store_title_fields
+from .models import Author, Post, Story, Subreddit
+from .post_iterator import PostIterator
+from .post_cache import invalidate_author, replace_cached
+from .records import PostRecord
+from .reddit_client import get_reddit
+
+# Everything on a Post that we take from reddit, `id` and `author` are handled separately
+POST_FIELDS = [
+	'subreddit',
+	'title',
+	'created_utc',
+	'url',
+	'selftext_html',
+	'likes',
+	'hidden',
+	'removed_by_category',
+	'edited',
+	'num_comments',
+]
+
+
+# Turns a praw submission into an (unsaved) Post for `author`
+def submission_to_post(submission, author):
+	return Post(
+		id=submission.id,
+		author=author,
+		subreddit=str(submission.subreddit),
+		title=submission.title,
+		created_utc=submission.created_utc,
+		url=submission.url,
+		selftext_html=submission.selftext_html,
+		likes=submission.likes,
+		hidden=bool(submission.hidden),
+		removed_by_category=submission.removed_by_category,
+		# False when not edited, otherwise a timestamp
+		edited=float(submission.edited or 0),
+		num_comments=submission.num_comments,
+	)
+
+
+# Inserts new posts and updates the ones we already have, in bulk
+def store_posts(posts):
+	posts = list({post.id: post for post in posts}.values())
+
+	if len(posts) == 0:
+		return 0
+
+	existing = set(Post.objects.filter(id__in=[post.id for post in posts]).values_list('id', flat=True))
+	now = datetime.datetime.now()
+
+	for post in posts:
+		post.fetched_at = now
+		store_title_fields(post)
+
+	with transaction.atomic():
+		Post.objects.bulk_create([post for post in posts if post.id not in existing], batch_size=500)
+		Post.objects.bulk_update([post for post in posts if post.id in existing], POST_FIELDS + TITLE_FIELDS + ['fetched_at'], batch_size=500)
+
+	return len(posts)
+
+
+# Stores `posts` and writes the listing `records` they were made from through to the post cache,
+# so neither keeps an older copy of a post the crawl just read
+def store_page(posts, records):
+	stored = store_posts(posts)
+	replace_cached(records)
+
+	return stored
+
+
+# The fields that change when a post is edited, commented on, voted on or hidden, comparing
+# them tells us whether a stored post is out of date without downloading anything but /api/info
+REVALIDATE_FIELDS = ['edited', 'num_comments', 'likes', 'hidden']
+
+
+# Asks reddit for the current state of stored `posts`, 100 per request, and rewrites the ones that changed,
+# both in the database and in the post cache, returns how many changed
+# Every 100 are stored as soon as they're checked, so when reddit fails halfway the first half is kept
+# `posts` can be any iterable (a queryset's .iterator() too) and should come with their author, select_related('author')
+def revalidate_posts(posts):
+	reddit = get_reddit()
+	changed = 0
+
+	for chunk in chunks(posts, 100):
+		stored = {post.id: post for post in chunk}
+		fresh = []
+		records = []
+
+		for submission in reddit.info(fullnames=[f't3_{post_id}' for post_id in stored]):
+			post = submission_to_post(submission, stored[submission.id].author)
+
+			if any(getattr(post, field) != getattr(stored[submission.id], field) for field in REVALIDATE_FIELDS):
+				fresh.append(post)
+				records.append(PostRecord.from_submission(submission))
+
+		store_posts(fresh)
+		replace_cached(records)
+
+		changed += len(fresh)
+
+	return changed
+
+
+# Is this submission at or past the newest post we stored for `author` last time?
+# Pinned posts never count, they show up first no matter how old they are, see `PostIterator`
+def is_known_post(submission, author):
+	if submission.id == author.newest_post_id:
+		return True
+
+	if submission.pinned or submission.stickied:
+		return False
+
+	return submission.created_utc < author.newest_created_utc
+
+
+# Fetches the posts `author` has made since the last sync and stores them locally
+# A full sync (or the first one for an author) walks the whole history instead
+def sync_author(author, full=False):
+	try:
+		return _sync_author(author, full)
+	except PrawcoreException as e:
+		# Running out of our own budget says nothing about the author
+		if not rate_limit.is_exhausted(e):
+			record_failure(author, e)
+
+		raise
+
+
+def _sync_author(author, full):
+	# A full sync that was asked for rewrites everything, cached posts that aren't listed anymore go too
+	if full and author.synced_at is not None:
+		invalidate_author(author)
+
+	full = full or author.synced_at is None or author.newest_created_utc is None
+
+	reddit = get_reddit()
+	iterator = PostIterator(reddit.redditor(author.username).submissions.new(limit=None))
+
+	stored = 0
+	page = []
+	records = []
+	newest = None
+
+	for submission in iterator:
+		if not full and is_known_post(submission, author):
+			break
+
+		post = submission_to_post(submission, author)
+		page.append(post)
+		records.append(submission)
+
+		if newest is None or post.created_utc > newest.created_utc:
+			newest = post
+
+		if len(page) >= 100:
+			stored += store_page(page, records)
+			page = []
+			records = []
+
+	stored += store_page(page, records)
+
+	# Only move the high-water mark once everything below it is stored
+	if newest is not None and (author.newest_created_utc is None or newest.created_utc > author.newest_created_utc):
+		author.newest_post_id = newest.id
+		author.newest_created_utc = newest.created_utc
+
+	author.synced_at = datetime.datetime.now()
+	author.failures = 0
+	author.last_error = ''
+	author.retry_at = None
+	Author.ordered_objects.filter(pk=author.pk).update(
+		synced_at=author.synced_at,
+		newest_post_id=author.newest_post_id,
+		newest_created_utc=author.newest_created_utc,
+		failures=0,
+		last_error='',
+		retry_at=None,
+	)
+
+	print(colorize(f'Stored {stored} {"" if full else "new "}posts for {author}', fg='green'))
+
+	return stored
+
+
+# Fetches the new posts of a whole subreddit since its last sync, and stores the ones made by authors we follow there
+# This costs the same for 1 or 100 authors, per-author syncs are then only needed to backfill authors
+# Reddit only lists the newest 1000 or so posts, so the listing only covers an author when it got back to the
+# last sync's newest post and the author was up to date at that sync, see split_covered()
+# The others are synced one by one with `sync_behind` (crawl_posts), otherwise that is left to their next own sync,
+# when the listing missed posts their high-water mark is lowered first so that sync walks back over the gap
+def sync_subreddit(name, sync_behind=True):
+	subreddit, _ = Subreddit.objects.get_or_create(name=name.lower())
+	previous = subreddit.synced_at
+	previous_post_id = subreddit.newest_post_id
+	previous_created_utc = subreddit.newest_created_utc
+
+	stories = Story.objects.filter(enabled=True, author__enabled=True, subreddit__iexact=subreddit.name).select_related('author')
+	authors = {story.author.username.lower(): story.author for story in stories}
+
+	iterator = PostIterator(get_reddit().subreddit(subreddit.name).new(limit=None))
+
+	stored = 0
+	page = []
+	records = []
+	newest = None
+	# The newest post of every author in this sync, by author pk
+	newest_of = {}
+	reached = False
+
+	for submission in iterator:
+		if subreddit.newest_created_utc is not None and is_known_post(submission, subreddit):
+			reached = True
+			break
+
+		if newest is None or submission.created_utc > newest.created_utc:
+			newest = submission
+
+		author = authors.get(str(submission.author).lower())
+
+		if author is None:
+			continue
+
+		post = submission_to_post(submission, author)
+		page.append(post)
+		records.append(submission)
+
+		if author.pk not in newest_of or post.created_utc > newest_of[author.pk].created_utc:
+			newest_of[author.pk] = post
+
+		if len(page) >= 100:
+			stored += store_page(page, records)
+			page = []
+			records = []
+
+	stored += store_page(page, records)
+
+	# Only move the high-water mark once everything below it is stored
+	if newest is not None and (subreddit.newest_created_utc is None or newest.created_utc > subreddit.newest_created_utc):
+		subreddit.newest_post_id = newest.id
+		subreddit.newest_created_utc = newest.created_utc
+
+	subreddit.synced_at = datetime.datetime.now()
+	subreddit.save()
+
+	print(colorize(f'Stored {stored} new posts from {subreddit} for {len(authors)} authors', fg='green'))
+
+	covered, behind = split_covered(authors.values(), reached, previous)
+
+	for author in advance_high_water_marks(covered, newest_of):
+		Author.ordered_objects.filter(pk=author.pk).update(newest_post_id=author.newest_post_id, newest_created_utc=author.newest_created_utc)
+
+	mark_authors_synced(covered)
+
+	# A listing that got back to the last sync stored everything since then, otherwise the gap is on their own syncs
+	if not reached:
+		for author in lower_high_water_marks(behind, previous_post_id, previous_created_utc):
+			Author.ordered_objects.filter(pk=author.pk).update(newest_post_id=author.newest_post_id, newest_created_utc=author.newest_created_utc)
+
+		if len(behind) > 0:
+			print(colorize(f'The listing of {subreddit} ended before the last sync, {len(behind)} authors need their own sync', fg='yellow'))
+
+	if sync_behind:
+		stored += sync_authors_behind(behind)
+
+	return stored
+
+
+# Syncs `authors` one by one, back to their own high-water mark, when a subreddit listing didn't cover them
+# Authors that were never synced still need their backfill, and the ones backing off are left alone
+def sync_authors_behind(authors):
+	stored = 0
+
+	for author in authors:
+		if author.synced_at is None or author.is_backing_off:
+			continue
+
+		try:
+			stored += sync_author(author)
+		except PrawcoreException:
+			# Already recorded by sync_author(), its synced_at stays where it was
+			pass
+
+	return stored
+
+
+# An author is as up to date as the least recently synced subreddit it has stories in
+# Authors that were never synced on their own are skipped, they still need their backfill
+def mark_authors_synced(authors):
+	for author in authors:
+		if author.synced_at is None:
+			continue
+
+		names = {name.lower() for name in Story.objects.filter(author=author, enabled=True).values_list('subreddit', flat=True)}
+		synced = list(Subreddit.objects.filter(name__in=names).values_list('synced_at', flat=True))
+
+		if len(synced) < len(names) or None in synced:
+			continue
+
+		if min(synced) > author.synced_at:
+			author.synced_at = min(synced)
+			Author.ordered_objects.filter(pk=author.pk).update(synced_at=author.synced_at)
+
+
+# sync_subreddit(), coalesced like sync_author_once()
+def sync_subreddit_once(name, sync_behind=True, lock_timeout=5 * 60):
+	def synced_at():
+		return Subreddit.objects.filter(name=name.lower()).values_list('synced_at', flat=True).first()
+
+	before = synced_at()
+
+	return singleflight.do(
+		f'sync-subreddit:{name.lower()}',
+		lambda: sync_subreddit(name, sync_behind),
+		lookup=lambda: 0 if synced_at() != before else None,
+		lock_timeout=lock_timeout,
+		wait=rate_limit.wait_limit(),
+	)
+
+
+# Brings an author up to date by syncing every subreddit it has stories in
+# When the listings didn't cover the author it is synced on its own too, the other authors they left behind are not,
+# those are left to crawl_posts or their own page loads
+# A failure backs the author off like a failed sync_author() does
+def sync_subreddits_of(author):
+	names = {name.lower() for name in Story.objects.filter(author=author, enabled=True).values_list('subreddit', flat=True)}
+	synced_at = author.synced_at
+
+	try:
+		stored = sum(sync_subreddit_once(name, sync_behind=False) for name in sorted(names))
+	except PrawcoreException as e:
+		if not rate_limit.is_exhausted(e):
+			record_failure(author, e)
+
+		raise
+
+	fresh = Author.ordered_objects.get(pk=author.pk)
+
+	for field in ('synced_at', 'newest_post_id', 'newest_created_utc'):
+		setattr(author, field, getattr(fresh, field))
+
+	if author.synced_at == synced_at:
+		stored += sync_author(author)
+
+	return stored
+
+
+# Remembers that syncing `author` failed, it isn't tried again for AUTHOR_BACKOFF seconds,
+# doubling with every failure in a row up to AUTHOR_BACKOFF_MAX
+# Suspended and banned accounts (or us being blocked) then only cost one request per backoff, not one per page load
+def record_failure(author, error):
+	backoff = getattr(settings, 'AUTHOR_BACKOFF', 60)
+	backoff_max = getattr(settings, 'AUTHOR_BACKOFF_MAX', 24 * 60 * 60)
+
+	author.failures += 1
+	author.last_error = repr(error)[:200]
+	author.retry_at = datetime.datetime.now() + datetime.timedelta(seconds=min(backoff * 2 ** (author.failures - 1), backoff_max))
+
+	Author.ordered_objects.filter(pk=author.pk).update(
+		failures=author.failures,
+		last_error=author.last_error,
+		retry_at=author.retry_at,
+	)
+
+	print(colorize(f'Syncing {author} failed with {author.last_error}, not trying again until {author.retry_at:%Y-%m-%d %H:%M:%S}', fg='red'))
+
+
+# Authors (by pk) that are waiting to be synced in the background, or being synced
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Runs those syncs, at most REDDIT_FETCH_WORKERS at a time, the rest wait in its queue
+_refresh_executor = None
+
+
+def _refresh_pool():
+	global _refresh_executor
+
+	with _refreshing_lock:
+		if _refresh_executor is None:
+			_refresh_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'REDDIT_FETCH_WORKERS', 8), thread_name_prefix='sync')
+
+		return _refresh_executor
+
+
+# sync_author(), but when the author is already being synced (by this or another process) it waits for that sync instead
+# Returns how many posts were stored by whoever did the sync
+def sync_author_once(author, full=False, lock_timeout=5 * 60):
+	synced_at = author.synced_at
+
+	def lookup():
+		# The sync that we waited for is done when synced_at moved, or it failed when the author is backing off
+		fresh = Author.ordered_objects.get(pk=author.pk)
+
+		if fresh.synced_at == synced_at and not fresh.is_backing_off:
+			return None
+
+		for field in ('synced_at', 'newest_post_id', 'newest_created_utc', 'failures', 'last_error', 'retry_at'):
+			setattr(author, field, getattr(fresh, field))
+
+		return 0
+
+	def sync():
+		# With REDDIT_SYNC_MODE = 'subreddit' authors are only synced one by one for their backfill,
+		# or when a subreddit listing cleared their high-water mark
+		if not full and author.synced_at is not None and author.newest_created_utc is not None and getattr(settings, 'REDDIT_SYNC_MODE', 'author') == 'subreddit':
+			return sync_subreddits_of(author)
+
+		return sync_author(author, full)
+
+	# Page loads only wait a moment for a sync that someone else is running, see refresh_author()
+	stored = singleflight.do(f'sync-author:{author.pk}', sync, lookup=lookup, lock_timeout=lock_timeout, wait=rate_limit.wait_limit())
+
+	# Threads in this process that waited on another thread's sync still have the old fields
+	if author.synced_at == synced_at:
+		lookup()
+
+	return stored
+
+
+def _sync_in_background(author):
+	try:
+		with rate_limit.priority(rate_limit.BACKGROUND):
+			sync_author_once(author)
+	except PrawcoreException as e:
+		print(colorize(f'Background sync of {author} failed with {e!r}', fg='red'))
+	finally:
+		with _refreshing_lock:
+			_refreshing.discard(author.pk)
+
+		# Every thread gets its own database connection, don't leak them
+		connection.close()
+
+
+# Stale-while-revalidate for an author's stored posts
+# Younger than LISTING_SOFT_TTL: used as they are
+# Younger than LISTING_HARD_TTL: used as they are, and synced in the background for the next request
+# Older, or never synced: synced before returning, a page load waits at most REDDIT_INTERACTIVE_WAIT seconds
+# for a sync that someone else is running and then uses what we have
+# Authors that are backing off after failed syncs are never synced, whatever we have stored is used
+def refresh_author(author):
+	soft_ttl = getattr(settings, 'LISTING_SOFT_TTL', 5 * 60)
+	hard_ttl = getattr(settings, 'LISTING_HARD_TTL', 60 * 60)
+
+	if author.is_backing_off:
+		return
+
+	# None for never synced
+	age = (datetime.datetime.now() - author.synced_at).total_seconds() if author.synced_at is not None else None
+
+	if age is None or age > hard_ttl:
+		try:
+			sync_author_once(author)
+		except PrawcoreException:
+			# Already recorded by sync_author(), the page shows what we have
+			pass
+		except singleflight.Timeout:
+			# Someone else is still syncing the author, the page shows what we have
+			pass
+	elif age > soft_ttl:
+		with _refreshing_lock:
+			if author.pk in _refreshing:
+				return
+
+			_refreshing.add(author.pk)
+
+		# A copy, so that the thread doesn't change synced_at under the request that is showing it
+		copy = Author.ordered_objects.get(pk=author.pk)
+		_refresh_pool().submit(_sync_in_background, copy)
+
+
+# Authors that have at least one enabled story, these are the ones worth crawling
+def get_authors_to_sync():
+	return Author.ordered_objects.filter(enabled=True, story__enabled=True).distinct()
+
+
+# Every subreddit an enabled author has an enabled story in, lowercase
+def get_subreddits_to_sync():
+	stories = Story.objects.filter(enabled=True, author__enabled=True)
+
+	return sorted({name.lower() for name in stories.values_list('subreddit', flat=True)})
@@ -0,0 +1,108 @@
+from collections import Counter
+
+from fuzzywuzzy import utils
+# fuzzywuzzy picks python-Levenshtein's matcher when it is installed, and difflib's otherwise,
+# we use the same one so that scores are always identical to fuzz.partial_ratio
+from fuzzywuzzy.fuzz import SequenceMatcher
+
+
+# Scores every title against every fragment in one call, like rapidfuzz's `cdist`
+# Returns a matrix where scores[t][f] == fuzz.partial_ratio(fragments[f], titles[t])
+#
+# `score_cutoffs` (one per fragment) lets us skip work, any score below its cutoff is returned as 0
+# This never changes the decision `score >= cutoff` compared to fuzz.partial_ratio
+#
+# Example:
+# partial_ratio_cdist(['First Contact - Chapter 1', 'Other'], ['First Contact'], [80]) returns [[100], [0]]
+def partial_ratio_cdist(titles, fragments, score_cutoffs=None):
+	if score_cutoffs is None:
+		score_cutoffs = [0] * len(fragments)
+
+	return [
+		_score_title(title, fragments, score_cutoffs)
+		for title in titles
+	]
+
+
+def _score_title(title, fragments, score_cutoffs):
+	scores = []
+
+	# The title is the longer string for almost every story fragment, difflib caches its
+	# work on the second string, so we keep one matcher per title and only swap the fragment
+	matcher = None
+	title_counts = None
+
+	for fragment, score_cutoff in zip(fragments, score_cutoffs):
+		if title is None or fragment is None:
+			scores.append(0)
+			continue
+
+		if fragment == title:
+			scores.append(100)
+			continue
+
+		if len(fragment) == 0 or len(title) == 0:
+			scores.append(0)
+			continue
+
+		if len(fragment) <= len(title):
+			if title_counts is None:
+				title_counts = Counter(title)
+
+			# No window of the title can share more characters with the fragment than the whole
+			# title does, and ratio() is at most 2 * shared / (len(fragment) + len(window))
+			shared = sum((Counter(fragment) & title_counts).values())
+			if 100 * 2 * shared / (len(fragment) + shared) < score_cutoff - 0.5:
+				scores.append(0)
+				continue
+
+			if matcher is None:
+				matcher = SequenceMatcher(None, fragment, title)
+			else:
+				matcher.set_seq1(fragment)
+
+			score = _partial_ratio(matcher, fragment, title, score_cutoff)
+		else:
+			score = _partial_ratio(SequenceMatcher(None, title, fragment), title, fragment, score_cutoff)
+
+		scores.append(score)
+
+	return scores
+
+
+# The same algorithm as fuzz.partial_ratio, see there for how it works
+def _partial_ratio(matcher, shorter, longer, score_cutoff):
+	# ratio() can never be higher than quick_ratio(), so windows that can't reach the cutoff
+	# (even after intr() rounds them up) don't need their expensive ratio() calculated
+	lowest_useful = (score_cutoff - 0.5) / 100
+
+	best = None
+	seen = set()
+
+	for block in matcher.get_matching_blocks():
+		long_start = block[1] - block[0] if (block[1] - block[0]) > 0 else 0
+		long_substr = longer[long_start:long_start + len(shorter)]
+
+		if long_substr in seen:
+			continue
+
+		seen.add(long_substr)
+
+		m2 = SequenceMatcher(None, shorter, long_substr)
+
+		if m2.real_quick_ratio() < lowest_useful or m2.quick_ratio() < lowest_useful:
+			continue
+
+		r = m2.ratio()
+		if r > .995:
+			return 100
+
+		if best is None or r > best:
+			best = r
+
+	if best is None:
+		return 0
+
+	score = utils.intr(100 * best)
+
+	return score if score >= score_cutoff else 0
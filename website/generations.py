@@ -0,0 +1,20 @@
+import time
+
+from django.core.cache import cache
+
+# Generation counters in the shared cache, workers compare the number they last saw with the current one
+# to find out that something (the post cache, the title rules) changed in another process
+
+
+# Moves the generation at `key` forward, for every process, returns the new generation
+def bump(key):
+	try:
+		return cache.incr(key)
+	except ValueError:
+		# Not there yet (or evicted), starting from the time means we never reuse an old generation
+		generation = time.time_ns() // 1000000
+
+		if not cache.add(key, generation, None):
+			return cache.incr(key)
+
+		return generation
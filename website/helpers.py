@@ -1,36 +1,21 @@
-import datetime
+import itertools
 import operator
 import re
-import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 
-import nltk as nltk
-from word2number import w2n
 from django.utils.termcolors import colorize
 
+from .numberwords import replace_number_words
+from .title_rules import pipeline_for, rewrite_title
+
 # Takes in string containing "numberwords" and returns it with those "numberwords" replaced with digits
 # Examples:
 # 'Hello one two three' becomes 'Hello 123'
 def replaceTextnumberWithNumber(text):
-	# Exceptions:
-	if len(text) > 10 and 'Seven Days of Fire' in text:
-		return text
-
-	tagged_number_words = 'ten/CD thousand/CD nine/CD hundred/CD ninety/CD eight/CD seven/CD six/CD five/CD four/CD three/CD two/CD one/CD eighty/CD seventy/CD sixty/CD fifty/CD forty/CD thirty/CD twenty/CD nineteen/CD eighteen/CD seventeen/CD sixteen/CD fifteen/CD fourteen/CD thirteen/CD twelve/CD eleven/CD zero/CD'
-	tagged_number_words_tuples = [nltk.tag.str2tuple(t) for t in tagged_number_words.split()]
-	my_tagger = nltk.UnigramTagger([ tagged_number_words_tuples ], backoff=nltk.DefaultTagger('IGNORE'))
-
-	my_grammar = 'NumberWord: {<CD>+}'
-	parser = nltk.RegexpParser(my_grammar)
-	parsed = parser.parse(my_tagger.tag(nltk.word_tokenize(text.lower())))
-
-	for tag in [tree.leaves() for tree in parsed.subtrees() if tree.label() == 'NumberWord']:
-		ut = nltk.untag(tag)
-		num = w2n.word_to_num(' '.join(ut))
-
-		r = re.compile(re.escape(' '.join(ut)), re.IGNORECASE)
-		text = r.sub(str(num), text)
-
-	return text
+	return replace_number_words(text)
 
 
 class DotDict(dict):
@@ -40,52 +25,250 @@ class DotDict(dict):
 	__delattr__ = dict.__delitem__
 
 
+# Splits any iterable into lists of `size` items, the last one may be shorter
+# Examples:
+# chunks([1, 2, 3], 2) yields [1, 2] and then [3]
+def chunks(iterable, size):
+	iterator = iter(iterable)
+
+	while True:
+		chunk = list(itertools.islice(iterator, size))
+
+		if len(chunk) == 0:
+			return
+
+		yield chunk
+
+
+# Calls fn(item) for every item on a pool of `max_workers` threads, all within one budget of `timeout` seconds
+# Returns the (item, result) pairs that finished in time and the (item, reason) pairs that didn't, reason is
+# the exception (one of `errors`) or 'timeout'
+# Items that haven't started when the time is up never start, running ones are left to finish on their own
+def map_within(fn, items, max_workers, timeout, errors=(Exception,)):
+	deadline = time.monotonic() + timeout
+	executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='map-within')
+	results = []
+	skipped = []
+
+	try:
+		futures = {executor.submit(fn, item): item for item in items}
+		done, pending = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+
+		for future in done:
+			try:
+				results.append((futures[future], future.result()))
+			except errors as e:
+				skipped.append((futures[future], e))
+
+		for future in pending:
+			future.cancel()
+			skipped.append((futures[future], 'timeout'))
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
+
+	return results, skipped
+
+
+# https://www.reddit.com/r/HFY/comments/abc123/some_title/, https://old.reddit.com/comments/abc123, https://redd.it/abc123
+SUBMISSION_URL = re.compile(r'^(?:https?://)?(?:[\w-]+\.)?(?:reddit\.com/(?:(?:r|u|user)/[\w-]+/)?comments/|redd\.it/)([a-z0-9]+)(?:[/?#]|$)', re.IGNORECASE)
+
+# Links from reddit's share button, https://www.reddit.com/r/HFY/s/AbCdEf123, they only redirect to the real url
+SHARE_URL = re.compile(r'^(?:https?://)?(?:[\w-]+\.)?reddit\.com/r/[\w-]+/s/\w+', re.IGNORECASE)
+
+
+# Returns the id of the submission a reddit url links to, without asking reddit, or None
+# Examples:
+# submission_id_from_url('https://redd.it/abc123') returns 'abc123'
+# submission_id_from_url('https://www.reddit.com/r/HFY/s/AbCdEf123') returns None, see is_share_url()
+def submission_id_from_url(url):
+	match = SUBMISSION_URL.match(url.strip())
+
+	return match.group(1).lower() if match is not None else None
+
+
+def is_share_url(url):
+	return SHARE_URL.match(url.strip()) is not None
+
+
+# A dict that forgets the least recently used keys once it holds more than `max_entries`, thread safe
+# With `max_bytes` it also keeps the total len() of its values under that
+class LRUCache:
+	def __init__(self, max_entries, max_bytes=None):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.bytes = 0
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def _size(self, value):
+		return len(value) if self.max_bytes is not None else 0
+
+	def get(self, key, default=None):
+		with self.lock:
+			try:
+				self.entries.move_to_end(key)
+			except KeyError:
+				return default
+
+			return self.entries[key]
+
+	def set(self, key, value):
+		with self.lock:
+			if key in self.entries:
+				self.bytes -= self._size(self.entries[key])
+
+			self.entries[key] = value
+			self.entries.move_to_end(key)
+			self.bytes += self._size(value)
+
+			while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+				_, oldest = self.entries.popitem(last=False)
+				self.bytes -= self._size(oldest)
+
+	def delete(self, key):
+		with self.lock:
+			if key in self.entries:
+				self.bytes -= self._size(self.entries.pop(key))
+
+	# A copy of every (key, value), oldest first
+	def items(self):
+		with self.lock:
+			return list(self.entries.items())
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.bytes = 0
+
+
+# Splits the (synced) `authors` of a subreddit into the ones its listing covered and the ones it left behind
+# A listing only covers an author when it got back to the previous sync of the subreddit (`reached`, synced at
+# `previous`) and the author was up to date then, with a high-water mark of its own
+# Authors that were never synced are in neither, they still need their backfill
+def split_covered(authors, reached, previous):
+	covered = []
+	behind = []
+
+	for author in authors:
+		if author.synced_at is None:
+			continue
+
+		if reached and previous is not None and author.newest_created_utc is not None and author.synced_at >= previous:
+			covered.append(author)
+		else:
+			behind.append(author)
+
+	return covered, behind
+
+
+# Moves the high-water mark (newest_post_id, newest_created_utc) of every author in `authors` up to its newest post
+# in `newest_of` (by author pk) when that is newer, returns the authors that moved
+def advance_high_water_marks(authors, newest_of):
+	moved = []
+
+	for author in authors:
+		newest = newest_of.get(author.pk)
+
+		if newest is None or (author.newest_created_utc is not None and newest.created_utc <= author.newest_created_utc):
+			continue
+
+		author.newest_post_id = newest.id
+		author.newest_created_utc = newest.created_utc
+		moved.append(author)
+
+	return moved
+
+
+# Moves the high-water mark of every author in `authors` back down to (post_id, created_utc) when it is past that,
+# a mark of None clears them, returns the authors that moved
+# Their next own sync then walks back over the posts a subreddit listing missed, even when another subreddit's
+# listing moved their mark past them
+def lower_high_water_marks(authors, post_id, created_utc):
+	moved = []
+
+	for author in authors:
+		if author.newest_created_utc is None or (created_utc is not None and author.newest_created_utc <= created_utc):
+			continue
+
+		author.newest_post_id = post_id if created_utc is not None else None
+		author.newest_created_utc = created_utc
+		moved.append(author)
+
+	return moved
+
+
 def sort_posts(posts):
 	return sorted(posts, reverse=True, key=operator.attrgetter('created_utc'))
 
 
-# noinspection RegExpRedundantEscape
+# Numbers in a standardized title, the chapter (range) of a post
+NUMBER_REGEX = re.compile(r'([0-9]+(?:[0-9\.]+)?)')
+
+# The fields of a Post that are derived from its title, see store_title_fields()
+TITLE_FIELDS = ['fixed_title', 'chapter_numbers', 'filename', 'title_version']
+
+
+# Whether `post` carries title fields made by the current title rules, only stored posts can
+def has_current_titles(post):
+	version = getattr(post, 'title_version', None)
+
+	return bool(version) and version == pipeline_for(post.author.name, str(post.subreddit)).version
+
+
+# The title as it's shown and used for filenames, see title_rules.py for the rules
 def standardize_title(post):
-	dt = datetime.datetime.fromtimestamp(post.created_utc)
+	if has_current_titles(post):
+		return post.fixed_title
 
-	# Nuke unicode
-	printable = set(string.printable)
-	common_name = ''.join(filter(lambda x: x in printable, post.title))
+	return rewrite_title(post.title, post.author.name, str(post.subreddit), post.created_utc)
 
-	common_name = replaceTextnumberWithNumber(common_name).strip('.')
-	common_name = re.sub(r'(.*)Tales From the Terran Republic(.*)', rf'TFtTR {dt:%Y-%m-%dT%H%M} - \1 \2', common_name, flags=re.IGNORECASE)
-	common_name = re.sub(r'\[OP\]', ' ', common_name)
-	common_name = re.sub(r'\[OC\]', ' ', common_name)
-	common_name = re.sub(r'[\[\]]', ' ', common_name)
-	common_name = re.sub(r' +', ' ', common_name)
-	common_name = re.sub(r'Story Continuation', '', common_name)
-	common_name = re.sub(r'^ Serial ', '', common_name)
 
-	if post.author.name == 'Ralts_Bloodthorne' and 'Chapter' in common_name[:7]:
-		common_name = f'First Contact - {common_name}'
+# Whether post.fixed_title is up to date, posts that aren't stored get theirs in get_N_subscriptions_posts()
+def has_fixed_title(post):
+	if getattr(post, 'title_version', None) is None:
+		return bool(getattr(post, 'fixed_title', None))
 
-	# He stopped numbering his posts on 2022-01-10, and therefore I started adding datestamps
-	# Sometimes this absolute mad lad posts multiple times per hour, so that's the that is required
-	if post.author.name == 'Ralts_Bloodthorne' and 'First Contact' in common_name[:13]:
-		common_name = common_name.replace('First Contact', f'FC - {dt:%Y%m%dT%H%M}')
+	return has_current_titles(post)
 
-	if post.author.name == 'Tigra21' and len(common_name) > 3 and common_name[:3] == 'HoH':
-		common_name = common_name.replace('HoH', 'Hunter or Huntress')
 
-	return common_name
+# The numbers in the title of a post that has_fixed_title()
+def chapter_numbers(post):
+	if has_current_titles(post):
+		return post.chapter_numbers.split()
 
+	return NUMBER_REGEX.findall(post.fixed_title)
 
-def generate_filename_for_post(post, extension='azw3'):
-	common_name = standardize_title(post)
 
+def filename_from_title(common_name):
 	filename = re.sub(r':', ' ', common_name)
 	filename = re.sub(r'/', ' ', filename)
 	filename = re.sub(r'’', ' ', filename)
 	filename = re.sub(r',', ' ', filename)
 	filename = re.sub(r'\?', ' ', filename)
-	filename = f'{filename[:96].strip()}.{extension}'
 
-	return filename
+	return filename[:96].strip()
+
+
+def generate_filename_for_post(post, extension='azw3'):
+	if has_current_titles(post):
+		return f'{post.filename}.{extension}'
+
+	return f'{filename_from_title(standardize_title(post))}.{extension}'
+
+
+# Works out the TITLE_FIELDS of a Post and sets them on it, so page views and ebook builds don't have to
+def store_title_fields(post):
+	pipeline = pipeline_for(post.author.name, str(post.subreddit))
+
+	post.fixed_title = rewrite_title(post.title, post.author.name, str(post.subreddit), post.created_utc)
+	post.chapter_numbers = ' '.join(NUMBER_REGEX.findall(post.fixed_title))
+	post.filename = filename_from_title(post.fixed_title)
+	post.title_version = pipeline.version
+
+	return post
 
 
 # Takes in two strings and returns the shortest common string from the start until they diverge
@@ -107,9 +290,21 @@ def find_common_prefix(a, b):
 	#print(f'find_common_prefix: {ret}')
 	return f'{ret}'
 
+# First Contact titles are timestamped, see title_rules.DEFAULT_RULES, not all of them have a chapter number
+FIRST_CONTACT_REGEX = re.compile(r'^FC - (?P<ts>[0-9T]+)(?: - Chapter ([0-9]+))?')
+
+
+# '12' is 12, '12.5' is 12.5, raises ValueError for anything else NUMBER_REGEX finds, like '1.2.3'
+def parse_chapter_number(n):
+	try:
+		return int(n)
+	except ValueError:
+		return float(n)
+
+
 def get_ebook_name_from_list_of_posts_first_contact(first, last):
-	first_matches = re.match(r'^FC - (?P<ts>[0-9T]+)(?: - Chapter ([0-9]+))?', first.fixed_title)
-	last_matches = re.match(r'^FC - (?P<ts>[0-9T]+)(?: - Chapter ([0-9]+))?', last.fixed_title)
+	first_matches = FIRST_CONTACT_REGEX.match(first.fixed_title)
+	last_matches = FIRST_CONTACT_REGEX.match(last.fixed_title)
 
 	if first_matches is None or last_matches is None:
 		print(f'Regex failed for either "{first.fixed_title}" or "{last.fixed_title}"')
@@ -130,7 +325,8 @@ def get_ebook_name_from_list_of_posts(posts):
 	posts = list(reversed(sort_posts(posts.copy())))
 
 	for post in posts:
-		post.fixed_title = standardize_title(post)
+		if not has_fixed_title(post):
+			post.fixed_title = standardize_title(post)
 
 	if len(posts) == 0:
 		raise Exception('called with an empty list')
@@ -140,10 +336,8 @@ def get_ebook_name_from_list_of_posts(posts):
 	first = posts[0]
 	last = posts[-1]
 
-	number_regex = re.compile(r'([0-9]+(?:[0-9\.]+)?)')
-
-	first_n = number_regex.findall(first.fixed_title)
-	last_n = number_regex.findall(last.fixed_title)
+	first_n = chapter_numbers(first)
+	last_n = chapter_numbers(last)
 
 	# First Contact has an annoying chapter name sometimes, so we handle it in a special way...
 	if first.fixed_title[0:2] == 'FC' and last.fixed_title[0:2] == 'FC':
@@ -165,14 +359,8 @@ def get_ebook_name_from_list_of_posts(posts):
 	# If we get here, we have a viable range
 	n = [ 0, 0 ]
 
-	def x(n):
-		try:
-			return int(n)
-		except ValueError:
-			return float(n)
-
-	n[0] = x(first_res)
-	n[1] = x(last_res)
+	n[0] = parse_chapter_number(first_res)
+	n[1] = parse_chapter_number(last_res)
 
 	# Try a common prefix method
 	try:
@@ -182,6 +370,6 @@ def get_ebook_name_from_list_of_posts(posts):
 		r = r.strip() # Strip any trailing separators
 		r += f' - {min(n)}-{max(n)}' # add the chapter range
 	except ValueError:
-		r = re.sub(number_regex, f'{min(n)}-{max(n)}', first.fixed_title)
+		r = re.sub(NUMBER_REGEX, f'{min(n)}-{max(n)}', first.fixed_title)
 
 	return r
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from prawcore import PrawcoreException
+
+from ... import rate_limit
+from ...crawler import sync_author, sync_subreddit, get_authors_to_sync, get_subreddits_to_sync
+
+
+# Run this periodically (cron, task scheduler) to keep the local post store fresh
+# python manage.py crawl_posts [username ...]
+# python manage.py crawl_posts --subreddits, reads every followed subreddit once and only crawls new authors one by one
+class Command(BaseCommand):
+	help = 'Fetches posts of every enabled author with enabled stories from reddit and stores them locally'
+
+	def add_arguments(self, parser):
+		parser.add_argument('usernames', nargs='*', help='Only crawl these authors')
+		parser.add_argument('--full', action='store_true', help='Walk the whole history instead of stopping at posts we already have')
+		parser.add_argument('--subreddits', action='store_true', help='Read the new posts of every followed subreddit instead of every author, authors that were never crawled are still crawled (backfill)')
+
+	def handle(self, *args, **options):
+		authors = get_authors_to_sync()
+
+		if options['usernames']:
+			authors = authors.filter(username__in=options['usernames'])
+
+		if options['subreddits']:
+			for name in get_subreddits_to_sync():
+				try:
+					with rate_limit.priority(rate_limit.BACKGROUND):
+						sync_subreddit(name)
+				except PrawcoreException as e:
+					self.stderr.write(f'r/{name} returned {e!r}, skipping')
+
+			if not options['full']:
+				authors = authors.filter(synced_at=None)
+
+		for author in authors:
+			# Authors named on the command line are always tried
+			if author.is_backing_off and not options['usernames']:
+				self.stdout.write(f'{author} failed {author.failures} times in a row, skipping until {author.retry_at:%Y-%m-%d %H:%M:%S}')
+				continue
+
+			try:
+				with rate_limit.priority(rate_limit.BACKGROUND):
+					sync_author(author, full=options['full'])
+			except PrawcoreException as e:
+				self.stderr.write(f'{author} returned {e!r}, skipping')
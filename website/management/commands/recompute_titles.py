@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from ...helpers import TITLE_FIELDS, chunks, store_title_fields
+from ...models import Post
+from ...title_rules import pipeline_for
+
+
+# Run this after changing title rules, only posts whose author and subreddit got new rules are redone
+# python manage.py recompute_titles [username ...]
+class Command(BaseCommand):
+	help = 'Works out the stored titles, chapter numbers and filenames again for posts made with older title rules'
+
+	def add_arguments(self, parser):
+		parser.add_argument('usernames', nargs='*', help='Only recompute posts of these authors')
+
+	def handle(self, *args, **options):
+		posts = Post.objects.select_related('author')
+
+		if options['usernames']:
+			posts = posts.filter(author__username__in=options['usernames'])
+
+		recomputed = 0
+
+		# Every (author, subreddit) has its own rules, and with them its own version
+		for username, subreddit in posts.values_list('author__username', 'subreddit').distinct().order_by():
+			version = pipeline_for(username, subreddit).version
+			stale = posts.filter(author__username=username, subreddit=subreddit).exclude(title_version=version)
+
+			# The pks first, updating rows while a cursor is still reading them can skip or repeat some
+			pks = list(stale.values_list('pk', flat=True))
+
+			for chunk in chunks(pks, 500):
+				Post.objects.bulk_update([store_title_fields(post) for post in posts.filter(pk__in=chunk)], TITLE_FIELDS)
+				recomputed += len(chunk)
+
+		self.stdout.write(f'Recomputed the titles of {recomputed} posts')
@@ -0,0 +1,48 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from prawcore import PrawcoreException
+
+from ... import rate_limit
+from ...crawler import revalidate_posts
+from ...helpers import chunks
+from ...models import Post
+
+
+# Run this periodically to pick up edited chapters, much cheaper than nuking the cache
+# python manage.py revalidate_posts [--days 30] [username ...]
+class Command(BaseCommand):
+	help = 'Checks stored posts against reddit and refreshes the ones that were edited, commented on, voted on or hidden'
+
+	def add_arguments(self, parser):
+		parser.add_argument('usernames', nargs='*', help='Only check posts of these authors')
+		parser.add_argument('--days', type=int, help='Only check posts made in the last this many days')
+
+	def handle(self, *args, **options):
+		posts = Post.objects.select_related('author')
+
+		if options['usernames']:
+			posts = posts.filter(author__username__in=options['usernames'])
+
+		if options['days'] is not None:
+			since = datetime.datetime.now() - datetime.timedelta(days=options['days'])
+			posts = posts.filter(created_utc__gte=since.timestamp())
+
+		checked = 0
+		changed = 0
+
+		# The pks first, updating rows while a cursor is still reading them can skip or repeat some,
+		# whatever was checked before reddit fails is already stored
+		pks = list(posts.values_list('pk', flat=True))
+
+		try:
+			with rate_limit.priority(rate_limit.BACKGROUND):
+				for chunk in chunks(pks, 100):
+					chunk = list(posts.filter(pk__in=chunk))
+					changed += revalidate_posts(chunk)
+					checked += len(chunk)
+		except PrawcoreException as e:
+			self.stderr.write(f'reddit returned {e!r} after {checked} posts ({changed} changed), stopping')
+			return
+
+		self.stdout.write(f'{changed} of {checked} posts changed')
@@ -0,0 +1,257 @@
+import re
+from collections import defaultdict
+
+from fuzzywuzzy import fuzz
+
+try:
+	from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+	import sre_parse
+
+from .fuzzy import partial_ratio_cdist
+from .helpers import LRUCache
+
+# (post title, story revision) -> does the title match the story, see StoryMatcher.recall()
+_match_results = LRUCache(100000)
+
+
+# Everything about a story that changes which titles match it, editing any of these
+# gives the story a new revision, and with it new matchers and match results
+def story_revision(story):
+	return story.title_fragment, story.is_regex, story.is_fuzzy, story.fuzzy_ratio
+
+
+# Decides whether a post belongs to a story, the regex is compiled once per story
+class StoryMatcher:
+	def __init__(self, story):
+		self.story = story
+		self.revision = story_revision(story)
+		self.subreddit = story.subreddit.lower()
+		self.regex = None
+
+		# Title search method
+		# non-fuzzy stuff first
+		if story.is_regex or not story.is_fuzzy:
+			title = story.title_fragment
+			if not story.is_regex:
+				title = re.escape(title)
+
+			self.regex = re.compile(title, re.IGNORECASE)
+
+	# Text that every matching title has to contain (ignoring case), or None when we can't tell
+	# Fuzzy stories can match anything, a regex only gives us its literal prefix
+	def required_text(self):
+		if self.regex is None:
+			return None
+
+		if not self.story.is_regex:
+			return self.story.title_fragment
+
+		try:
+			parsed = sre_parse.parse(self.story.title_fragment)
+		except re.error:
+			return None
+
+		literal = ''
+
+		for op, value in parsed:
+			if op == sre_parse.AT and literal == '':
+				continue
+
+			if op != sre_parse.LITERAL:
+				break
+
+			literal += chr(value)
+
+		return literal or None
+
+	def in_subreddit(self, post):
+		# Works for both praw (which compares case insensitively by itself) and stored posts
+		return str(post.subreddit).lower() == self.subreddit
+
+	def matches(self, post):
+		if not self.in_subreddit(post):
+			return False
+
+		matched = self.recall(post)
+		if matched is not None:
+			return matched
+
+		if self.regex is not None:
+			return self.remember(post, self.regex.search(post.title) is not None)
+
+		# fuzzy stuff
+		return self.remember(post, fuzz.partial_ratio(self.story.title_fragment, post.title) >= self.story.fuzzy_ratio)
+
+	# Returns what we found the last time this title was matched against this revision of the story, or None
+	# Keyed on the title rather than the post id, the result only depends on the title, and crossposts share it
+	def recall(self, post):
+		return _match_results.get((post.title, self.revision))
+
+	def remember(self, post, matched):
+		_match_results.set((post.title, self.revision), matched)
+
+		return matched
+
+
+# re.IGNORECASE lets these non-ascii characters match ascii letters, found by trying every codepoint
+CASE_FOLD = str.maketrans({
+	**{c: c.lower() for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'},
+	'\u0130': 'i',
+	'\u0131': 'i',
+	'\u017f': 's',
+	'\u212a': 'k',
+})
+
+
+# Every ascii 3 character piece of `text`, lowercased the same way re.IGNORECASE compares
+def trigrams(text):
+	text = text.translate(CASE_FOLD)
+	return {text[i:i + 3] for i in range(len(text) - 2) if text[i:i + 3].isascii()}
+
+
+# Inverted index from trigrams to stories
+# A title can only match a story if it contains every trigram of the text the story requires,
+# so only those stories need their regex run, stories we can't reason about are always candidates
+class StoryIndex:
+	def __init__(self, matchers):
+		self.postings = defaultdict(list)
+		self.needed = {}
+		self.unindexed = set()
+
+		for i, matcher in enumerate(matchers):
+			text = matcher.required_text()
+			grams = trigrams(text) if text is not None else set()
+
+			if len(grams) == 0:
+				self.unindexed.add(i)
+				continue
+
+			self.needed[i] = len(grams)
+
+			for gram in grams:
+				self.postings[gram].append(i)
+
+	def candidates(self, title):
+		found = defaultdict(int)
+
+		for gram in trigrams(title):
+			for i in self.postings.get(gram, ()):
+				found[i] += 1
+
+		return self.unindexed | {i for i, n in found.items() if n == self.needed[i]}
+
+
+# Below this many stories running every regex is cheaper than looking up the index
+INDEX_MIN_STORIES = 16
+
+
+# Matches a post against many stories at once
+# Example:
+# matcher = MultiStoryMatcher(stories)
+# matcher.match(post) returns the indexes (into `stories`) of every story the post belongs to
+class MultiStoryMatcher:
+	def __init__(self, stories):
+		self.matchers = [get_story_matcher(story) for story in stories]
+		self.index = StoryIndex(self.matchers) if len(self.matchers) >= INDEX_MIN_STORIES else None
+
+	def __len__(self):
+		return len(self.matchers)
+
+	def candidates(self, post):
+		if self.index is None:
+			return range(len(self.matchers))
+
+		return self.index.candidates(post.title)
+
+	# `active` limits matching to some of the stories, e.g. the ones still looking for posts
+	def match(self, post, active=None):
+		return self.match_page([post], active)[0]
+
+	# Same as calling match() for every post, but all fuzzy stories are scored against all
+	# the titles in one go, returns one list of story indexes per post
+	# Results are remembered, so matching the same posts again is almost free
+	def match_page(self, posts, active=None):
+		if active is None:
+			active = range(len(self.matchers))
+
+		# The stories each post could belong to, in `active` order
+		todo = []
+		for post in posts:
+			candidates = self.candidates(post)
+			todo.append([i for i in active if i in candidates and self.matchers[i].in_subreddit(post)])
+
+		decided = {}
+		fuzzy_rows = defaultdict(set)
+
+		for row, post in enumerate(posts):
+			for i in todo[row]:
+				matcher = self.matchers[i]
+				matched = matcher.recall(post)
+
+				if matched is not None:
+					decided[row, i] = matched
+				elif matcher.regex is not None:
+					decided[row, i] = matcher.remember(post, matcher.regex.search(post.title) is not None)
+				else:
+					fuzzy_rows[i].add(row)
+
+		if len(fuzzy_rows) > 0:
+			fuzzy = list(fuzzy_rows)
+			rows = sorted(set().union(*fuzzy_rows.values()))
+
+			scores = partial_ratio_cdist(
+				[posts[row].title for row in rows],
+				[self.matchers[i].story.title_fragment for i in fuzzy],
+				[self.matchers[i].story.fuzzy_ratio for i in fuzzy],
+			)
+
+			for n, row in enumerate(rows):
+				for column, i in enumerate(fuzzy):
+					if row in fuzzy_rows[i]:
+						matcher = self.matchers[i]
+						decided[row, i] = matcher.remember(posts[row], scores[n][column] >= matcher.story.fuzzy_ratio)
+
+		return [[i for i in todo[row] if decided[row, i]] for row in range(len(posts))]
+
+
+# Matchers are kept between requests, the key is everything a matcher is built from, so an
+# edited story gets a new matcher (and index) in every process, clear_matchers() frees old ones
+_story_matchers = {}
+_matchers = {}
+
+
+def get_story_matcher(story):
+	key = (story.subreddit, *story_revision(story))
+
+	matcher = _story_matchers.get(key)
+
+	if matcher is None:
+		if len(_story_matchers) > 1000:
+			_story_matchers.clear()
+
+		matcher = _story_matchers[key] = StoryMatcher(story)
+
+	return matcher
+
+
+def get_multi_story_matcher(stories):
+	key = tuple(
+		(story.pk, story.subreddit, story.title_fragment, story.is_regex, story.is_fuzzy, story.fuzzy_ratio)
+		for story in stories
+	)
+
+	matcher = _matchers.get(key)
+
+	if matcher is None:
+		if len(_matchers) > 1000:
+			_matchers.clear()
+
+		matcher = _matchers[key] = MultiStoryMatcher(stories)
+
+	return matcher
+
+
+def clear_matchers():
+	_story_matchers.clear()
+	_matchers.clear()
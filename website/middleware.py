@@ -1,5 +1,9 @@
 import json
+import time
 from django.conf import settings
+from django.http import HttpResponse
+
+from . import rate_limit
 
 class Headers:
 	def __init__(self, get_response):
@@ -35,3 +39,20 @@ class CSRFG:
 		response.context["csrf"] = 'bacon'
 
 		return response
+
+# Requests that ran out of reddit budget get a 503 instead of a 500, they can be retried next minute
+class RedditBudget:
+	def __init__(self, get_response):
+		self.get_response = get_response
+
+	def __call__(self, request):
+		return self.get_response(request)
+
+	def process_exception(self, request, exception):
+		if not rate_limit.is_exhausted(exception):
+			return None
+
+		response = HttpResponse('Too many requests to reddit right now, try again in a minute', status=503)
+		response['Retry-After'] = str(60 - int(time.time()) % 60)
+
+		return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0010_alter_story_add_fuzzy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                ('id', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('subreddit', models.CharField(max_length=200)),
+                ('title', models.CharField(max_length=400)),
+                ('created_utc', models.FloatField()),
+                ('url', models.CharField(max_length=2000)),
+                ('selftext_html', models.TextField(null=True)),
+                ('likes', models.BooleanField(null=True)),
+                ('hidden', models.BooleanField(default=False)),
+                ('removed_by_category', models.CharField(max_length=200, null=True)),
+                ('edited', models.FloatField(default=0)),
+                ('num_comments', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='website.author')),
+            ],
+            options={
+                'ordering': ['-created_utc'],
+                'indexes': [models.Index(fields=['author', '-created_utc'], name='post_author_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='newest_created_utc',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='newest_post_id',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0012_author_high_water_mark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='last_error',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
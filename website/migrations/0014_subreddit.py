@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0013_author_failures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subreddit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('newest_post_id', models.CharField(blank=True, max_length=16, null=True)),
+                ('newest_created_utc', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+# What helpers.standardize_title did before the rules were stored, a copy of title_rules.DEFAULT_RULES
+DEFAULT_RULES = [
+    {'kind': 'printable'},
+    {'kind': 'number_words'},
+    {'pattern': r'^\.+|\.+$'},
+    {'pattern': r'(.*)Tales From the Terran Republic(.*)', 'replacement': r'TFtTR {created:%Y-%m-%dT%H%M} - \1 \2', 'ignore_case': True},
+    {'pattern': r'\[OP\]', 'replacement': ' '},
+    {'pattern': r'\[OC\]', 'replacement': ' '},
+    {'pattern': r'[\[\]]', 'replacement': ' '},
+    {'pattern': r' +', 'replacement': ' '},
+    {'pattern': r'Story Continuation'},
+    {'pattern': r'^ Serial '},
+    {'author': 'Ralts_Bloodthorne', 'pattern': r'^(?=Chapter)', 'replacement': 'First Contact - '},
+    {'author': 'Ralts_Bloodthorne', 'condition': r'^First Contact', 'pattern': r'First Contact', 'replacement': 'FC - {created:%Y%m%dT%H%M}'},
+    {'author': 'Tigra21', 'condition': r'^HoH[\s\S]', 'pattern': r'HoH', 'replacement': 'Hunter or Huntress'},
+]
+
+
+def add_default_rules(apps, schema_editor):
+    TitleRule = apps.get_model('website', 'TitleRule')
+
+    TitleRule.objects.bulk_create([
+        TitleRule(position=(i + 1) * 10, **rule) for i, rule in enumerate(DEFAULT_RULES)
+    ])
+
+
+def remove_default_rules(apps, schema_editor):
+    apps.get_model('website', 'TitleRule').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0014_subreddit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(default=0)),
+                ('kind', models.CharField(choices=[('printable', 'Drop non-printable characters'), ('number_words', 'Number words to digits'), ('sub', 'Regex substitution')], default='sub', max_length=20)),
+                ('author', models.CharField(blank=True, default='', max_length=200)),
+                ('subreddit', models.CharField(blank=True, default='', max_length=200)),
+                ('condition', models.CharField(blank=True, default='', max_length=400)),
+                ('pattern', models.CharField(blank=True, default='', max_length=400)),
+                ('replacement', models.CharField(blank=True, default='', max_length=400)),
+                ('ignore_case', models.BooleanField(default=False)),
+                ('enabled', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.RunPython(add_default_rules, remove_default_rules),
+    ]
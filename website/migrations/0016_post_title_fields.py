@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0015_titlerule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='chapter_numbers',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='filename',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='fixed_title',
+            field=models.CharField(blank=True, default='', max_length=400),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='title_version',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
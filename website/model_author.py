@@ -1,8 +1,11 @@
-import praw
+import datetime
+
 from django.db import models
 from django.db.models.functions import Lower
 from django.forms import ModelForm
 
+from .reddit_client import get_reddit
+
 
 class AuthorOrderManager(models.Manager):
 	def get_queryset(self):
@@ -13,6 +16,18 @@ class Author(models.Model):
 	username = models.CharField(max_length=200)
 	enabled = models.BooleanField(default=True)
 
+	# When the crawler last stored this author's posts, None means never
+	synced_at = models.DateTimeField(null=True, blank=True)
+
+	# The newest post the crawler has seen, syncs stop paging once they get back to it
+	newest_post_id = models.CharField(max_length=16, null=True, blank=True)
+	newest_created_utc = models.FloatField(null=True, blank=True)
+
+	# Syncs that failed in a row, the last error, and when we may try again, see crawler.record_failure()
+	failures = models.PositiveIntegerField(default=0)
+	last_error = models.CharField(max_length=200, blank=True, default='')
+	retry_at = models.DateTimeField(null=True, blank=True)
+
 	constraints = [
 		models.UniqueConstraint(fields=['username'], name='username must be unique')
 	]
@@ -22,8 +37,18 @@ class Author(models.Model):
 	def __str__(self):
 		return self.username
 
+	# Lets stored posts be used where praw's `post.author.name` is expected
+	@property
+	def name(self):
+		return self.username
+
+	# An author that keeps failing isn't asked for again until its retry_at
+	@property
+	def is_backing_off(self):
+		return self.retry_at is not None and datetime.datetime.now() < self.retry_at
+
 	def __getitem__(self, item):
-		reddit = praw.Reddit()
+		reddit = get_reddit()
 
 		if item == 'username':
 			return reddit.user(self.username)
@@ -0,0 +1,43 @@
+from django.db import models
+from .model_author import Author
+
+
+# A local copy of a reddit submission, filled in by the crawler so that
+# page views don't have to go to reddit
+class Post(models.Model):
+	# reddit's base36 id, e.g. `oheh52`
+	id = models.CharField(max_length=16, primary_key=True)
+	author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='posts')
+	subreddit = models.CharField(max_length=200)
+	title = models.CharField(max_length=400)
+	created_utc = models.FloatField()
+	url = models.CharField(max_length=2000)
+	selftext_html = models.TextField(null=True)
+
+	# None means no vote, same as praw
+	likes = models.BooleanField(null=True)
+	hidden = models.BooleanField(default=False)
+	removed_by_category = models.CharField(max_length=200, null=True)
+
+	# reddit says False for unedited posts, otherwise the timestamp of the edit, we store 0 for False
+	edited = models.FloatField(default=0)
+	num_comments = models.IntegerField(default=0)
+
+	fetched_at = models.DateTimeField(auto_now=True)
+
+	# Worked out from the title by helpers.store_title_fields() when the post is stored, title_version is the
+	# version of the title rules that made them, `recompute_titles` redoes the posts with an older one
+	fixed_title = models.CharField(max_length=400, blank=True, default='')
+	chapter_numbers = models.CharField(max_length=200, blank=True, default='')
+	filename = models.CharField(max_length=100, blank=True, default='')
+	title_version = models.CharField(max_length=40, blank=True, default='')
+
+	def __str__(self):
+		return self.title
+
+	class Meta:
+		ordering = ['-created_utc']
+
+		indexes = [
+			models.Index(fields=['author', '-created_utc'], name='post_author_created'),
+		]
@@ -0,0 +1,20 @@
+from django.db import models
+
+
+# How far the subreddit crawler got, see crawler.sync_subreddit()
+class Subreddit(models.Model):
+	# Lowercase, like r/hfy
+	name = models.CharField(max_length=200, unique=True)
+
+	# When the crawler last read this subreddit's new posts, None means never
+	synced_at = models.DateTimeField(null=True, blank=True)
+
+	# The newest post the crawler has seen, syncs stop paging once they get back to it
+	newest_post_id = models.CharField(max_length=16, null=True, blank=True)
+	newest_created_utc = models.FloatField(null=True, blank=True)
+
+	def __str__(self):
+		return f'r/{self.name}'
+
+	class Meta:
+		ordering = ['name']
@@ -0,0 +1,60 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+from .title_rules import SAMPLE_DATE, expand_dates
+
+
+# One step of the title rewrite pipeline, see title_rules.py
+# Rules without an author or subreddit apply to every post, rules run ordered by position
+class TitleRule(models.Model):
+	PRINTABLE = 'printable'
+	NUMBER_WORDS = 'number_words'
+	SUB = 'sub'
+
+	KINDS = [
+		(PRINTABLE, 'Drop non-printable characters'),
+		(NUMBER_WORDS, 'Number words to digits'),
+		(SUB, 'Regex substitution'),
+	]
+
+	position = models.IntegerField(default=0)
+	kind = models.CharField(max_length=20, choices=KINDS, default=SUB)
+
+	# Empty means every author / every subreddit, compared case insensitively
+	author = models.CharField(max_length=200, blank=True, default='')
+	subreddit = models.CharField(max_length=200, blank=True, default='')
+
+	# The rule only runs on titles this regex finds something in, empty means always
+	condition = models.CharField(max_length=400, blank=True, default='')
+
+	# For SUB: re.sub(pattern, replacement), the replacement can use the post's date like `{created:%Y%m%d}`,
+	# other braces are kept as they are
+	pattern = models.CharField(max_length=400, blank=True, default='')
+	replacement = models.CharField(max_length=400, blank=True, default='')
+	ignore_case = models.BooleanField(default=False)
+
+	enabled = models.BooleanField(default=True)
+
+	def __str__(self):
+		if self.kind == self.SUB:
+			return f'{self.pattern} -> {self.replacement}'
+
+		return self.get_kind_display()
+
+	def clean(self):
+		for field in ('condition', 'pattern'):
+			try:
+				re.compile(getattr(self, field))
+			except re.error as e:
+				raise ValidationError({field: f'Not a valid regex: {e}'})
+
+		if self.kind == self.SUB:
+			try:
+				re.compile(self.pattern).sub(expand_dates(self.replacement, SAMPLE_DATE), '')
+			except (re.error, ValueError) as e:
+				raise ValidationError({'replacement': f'Not a valid replacement: {e}'})
+
+	class Meta:
+		ordering = ['position', 'id']
@@ -1,3 +1,6 @@
 # While these lines look unused, the project requires them
 from .model_author import Author
 from .model_story import Story
+from .model_post import Post
+from .model_subreddit import Subreddit
+from .model_title_rule import TitleRule
@@ -0,0 +1,78 @@
+import functools
+import re
+
+import nltk
+from word2number import w2n
+
+# The words that are turned into digits, anything else (hyphenated words, 'a', 'and', 'million') is left alone
+NUMBER_WORDS = [
+	'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',
+	'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen',
+	'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety', 'hundred', 'thousand',
+]
+NUMBER_WORD_SET = frozenset(NUMBER_WORDS)
+
+# Longest first, so 'seventeen' is tried before 'seven'
+_WORD = '(?:' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + ')'
+
+# Text without any of these can not change
+_ANY_WORD = re.compile(_WORD, re.IGNORECASE)
+
+# nltk's word tokenizer splits these off into tokens of their own, so a word next to them is a whole token
+_SPLIT = r'\s()\[\]{}<>;@#$%&?!*'
+
+# A number word that nltk's tokenizer would make a token of its own, and then as many more as follow
+# separated by nothing but whitespace, that's one <CD>+ chunk in nltk terms
+# `:` and `,` are split off unless a digit follows them, `--` is split off but a single `-` is part of the word
+_BEFORE = rf'(?:^|(?<=[{_SPLIT}:,])|(?<=--))'
+_AFTER = rf'(?=$|[{_SPLIT}]|[:,](?!\d)|--)'
+_CHUNK = re.compile(rf'{_BEFORE}{_WORD}{_AFTER}(?:\s+{_WORD}{_AFTER})*')
+
+# Quotes, apostrophes, periods (sentence splitting), non-ascii and runs of `:,` or `-` make
+# nltk's tokenizer do things _CHUNK doesn't copy, text with any of those goes through nltk itself
+_NEEDS_NLTK = re.compile(r'[.\'"`]|[:,]{2}|-{3}|[^\x00-\x7f]')
+
+
+# Takes in string containing "numberwords" and returns it with those "numberwords" replaced with digits
+# Gives the same result as the nltk tagger + chunker this replaced (benchmarks/bench_numberwords.py), including
+# its quirks: numbers are replaced everywhere in the text, also inside other words ('someone' can become 'some1')
+# Examples:
+# 'Hello one two three' becomes 'Hello 123'
+@functools.lru_cache(maxsize=100000)
+def replace_number_words(text):
+	# Exceptions:
+	if len(text) > 10 and 'Seven Days of Fire' in text:
+		return text
+
+	if _ANY_WORD.search(text) is None:
+		return text
+
+	for chunk in find_chunks(text.lower()):
+		num = w2n.word_to_num(chunk)
+
+		r = re.compile(re.escape(chunk), re.IGNORECASE)
+		text = r.sub(str(num), text)
+
+	return text
+
+
+# The runs of number words in `text` (lowercase), each joined with single spaces
+def find_chunks(text):
+	if _NEEDS_NLTK.search(text) is None:
+		return [' '.join(match.group().split()) for match in _CHUNK.finditer(text)]
+
+	return chunks_from_tokens(nltk.word_tokenize(text))
+
+
+def chunks_from_tokens(tokens):
+	chunks = []
+	chunk = []
+
+	for token in tokens + ['']:
+		if token in NUMBER_WORD_SET:
+			chunk.append(token)
+		elif len(chunk) > 0:
+			chunks.append(' '.join(chunk))
+			chunk = []
+
+	return chunks
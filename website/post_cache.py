@@ -0,0 +1,329 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import singleflight
+from .generations import bump
+from .helpers import LRUCache, chunks
+from .records import PostRecord
+from .reddit_client import get_reddit
+
+# invalidate_all() bumps this, workers drop their whole local tier when they see it change
+EPOCH_KEY = 'post-cache-epoch'
+
+# Changes to some posts (a vote, a revalidation, a nuked story) are numbered by this counter and stored under
+# `post-cache-change:<n>` for CHANGE_TTL seconds, every worker drops just those posts from its local tier
+# A worker that can't read every change since it last looked (more than MAX_CHANGES_BEHIND, or expired)
+# drops its whole local tier instead
+CHANGES_KEY = 'post-cache-changes'
+CHANGE_TTL = 60 * 60
+MAX_CHANGES_BEHIND = 1000
+
+# How often (seconds) a worker asks the shared cache whether some other worker invalidated posts
+EPOCH_CHECK_INTERVAL = 1
+
+# Posts are cached under `post:<global generation>:<id>`, so bumping the global generation
+# orphans every post at once, the orphans expire or get culled by the cache backend
+GLOBAL_SCOPE = 'global'
+
+
+# Hit/miss counters for both tiers, so they can be sized
+class TierStats:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.counts = {}
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.counts = {'local_hits': 0, 'local_misses': 0, 'shared_hits': 0, 'shared_misses': 0}
+
+	def count(self, name):
+		self.count_many(name, 1)
+
+	def count_many(self, name, n):
+		with self.lock:
+			self.counts[name] += n
+
+	def as_dict(self):
+		with self.lock:
+			return dict(self.counts)
+
+
+# The in-process tier, record bytes by post id, bounded by entry count and total bytes
+local = LRUCache(
+	getattr(settings, 'POST_CACHE_LOCAL_ENTRIES', 10000),
+	getattr(settings, 'POST_CACHE_LOCAL_BYTES', 64 * 1024 * 1024),
+)
+stats = TierStats()
+
+_epoch = {'value': None, 'checked_at': 0, 'generation': 0, 'change': None}
+_epoch_lock = threading.Lock()
+
+
+# Drops what other workers changed since we last looked from the local tier
+def _check_epoch():
+	now = time.monotonic()
+
+	if now - _epoch['checked_at'] < EPOCH_CHECK_INTERVAL:
+		return
+
+	with _epoch_lock:
+		_epoch['checked_at'] = now
+		found = cache.get_many([EPOCH_KEY, CHANGES_KEY, _generation_key(GLOBAL_SCOPE)])
+		epoch = found.get(EPOCH_KEY)
+		change = found.get(CHANGES_KEY, 0)
+
+		if epoch != _epoch['value']:
+			local.clear()
+			_epoch['value'] = epoch
+		elif _epoch['change'] is not None and change != _epoch['change']:
+			_apply_changes(_epoch['change'], change)
+
+		_epoch['change'] = change
+		_epoch['generation'] = found.get(_generation_key(GLOBAL_SCOPE), 0)
+
+
+def _change_key(n):
+	return f'post-cache-change:{n}'
+
+
+def _apply_changes(seen, latest):
+	if not 0 < latest - seen <= MAX_CHANGES_BEHIND:
+		local.clear()
+		return
+
+	keys = [_change_key(n) for n in range(seen + 1, latest + 1)]
+	found = cache.get_many(keys)
+
+	# Expired, or not written yet by the worker that counted it
+	if len(found) < len(keys):
+		local.clear()
+		return
+
+	for key in keys:
+		_forget(found[key])
+
+
+# Removes the posts of one change from the local tier
+# A change is {'posts': [post id, ...], 'scopes': [(author, subreddit or None), ...]}, both lowercase
+def _forget(change):
+	for post_id in change['posts']:
+		local.delete(post_id)
+
+	if len(change['scopes']) == 0:
+		return
+
+	for post_id, data in local.items():
+		record = PostRecord.from_bytes(data)
+
+		for author_name, subreddit in change['scopes']:
+			if record is None or (str(record.author).lower() == author_name and subreddit in (None, str(record.subreddit).lower())):
+				local.delete(post_id)
+				break
+
+
+# Tells every worker (this one right away) to forget some posts
+def _publish(posts=(), scopes=()):
+	change = {'posts': list(posts), 'scopes': list(scopes)}
+
+	# When the counter was evicted it starts again from the time, workers that counted from the old value see a jump
+	# and clear everything
+	n = bump(CHANGES_KEY)
+
+	cache.set(_change_key(n), change, CHANGE_TTL)
+	_forget(change)
+
+
+def _generation_key(scope):
+	return f'post-cache-generation:{scope}'
+
+
+def _author_scope(author_name):
+	return f'author:{author_name.lower()}'
+
+
+# A story is every post of its author in its subreddit, that is as narrow as we can know without matching titles
+def _story_scope(author_name, subreddit):
+	return f'story:{author_name.lower()}:{subreddit.lower()}'
+
+
+def _post_key(post_id):
+	return f'post:{_epoch["generation"]}:{post_id}'
+
+
+# The current generations of the author and story a record belongs to, a cached record is only
+# used while they are the same as when it was stored
+def _stamp(record):
+	return _stamps([record])[0]
+
+
+# _stamp() for many records with one cache lookup
+def _stamps(records):
+	keys = [
+		(_generation_key(_author_scope(record.author)), _generation_key(_story_scope(record.author, record.subreddit)))
+		for record in records
+	]
+	found = cache.get_many({key for pair in keys for key in pair})
+
+	return [tuple(found.get(key, 0) for key in pair) for pair in keys]
+
+
+# Makes every worker recheck the epoch (and the global generation) on its next lookup
+def _bump_epoch():
+	bump(EPOCH_KEY)
+	local.clear()
+	_epoch['checked_at'] = 0
+
+
+def get_cache_stats():
+	return {**stats.as_dict(), 'local_entries': len(local), 'local_bytes': local.bytes}
+
+
+# Takes a praw submission and returns a PostRecord of it
+# Looks in this process first, then in the shared django cache, and only then reads the submission
+def get_or_set_cache(post, how_long=60 * 60 * 24 * 7):
+	_check_epoch()
+
+	data = local.get(post.id)
+
+	if data is not None:
+		stats.count('local_hits')
+		return PostRecord.from_bytes(data)
+
+	stats.count('local_misses')
+
+	key = _post_key(post.id)
+	record = _get_shared(post.id, key)
+
+	if record is not None:
+		stats.count('shared_hits')
+		return record
+
+	stats.count('shared_misses')
+
+	# Only one thread (in all processes) reads a missing post from reddit, the others wait for it
+	return singleflight.do(key, lambda: _set_shared(post, key, how_long), lookup=lambda: _get_shared(post.id, key), lock_timeout=30)
+
+
+def _get_shared(post_id, key):
+	stamp, data = cache.get(key, (None, None))
+	record = PostRecord.from_bytes(data) if data is not None else None
+
+	# None for entries of an older record version, those get replaced, same for invalidated authors and stories
+	if record is None or stamp != _stamp(record):
+		return None
+
+	local.set(post_id, data)
+
+	return record
+
+
+def _set_shared(post, key, how_long):
+	# reading the fields makes it non-lazy
+	record = PostRecord.from_submission(post)
+	data = record.to_bytes()
+
+	cache.set(key, (_stamp(record), data), how_long)
+	local.set(post.id, data)
+
+	return record
+
+
+# get_or_set_cache() for many post ids at once, returns records in the order of `post_ids`
+# Posts that are in neither cache are read from reddit's /api/info, 100 per request, and cached with one set_many()
+# Posts reddit doesn't know about (or won't show us) are left out
+def get_or_set_cache_many(post_ids, how_long=60 * 60 * 24 * 7):
+	_check_epoch()
+
+	post_ids = list(dict.fromkeys(post_ids))
+	found = {}
+
+	for post_id in post_ids:
+		data = local.get(post_id)
+
+		if data is not None:
+			stats.count('local_hits')
+			found[post_id] = PostRecord.from_bytes(data)
+		else:
+			stats.count('local_misses')
+
+	keys = {_post_key(post_id): post_id for post_id in post_ids if post_id not in found}
+	cached = []
+
+	for key, (stamp, data) in cache.get_many(keys).items():
+		record = PostRecord.from_bytes(data)
+
+		if record is not None:
+			cached.append((stamp, data, record))
+
+	for (stamp, data, record), current in zip(cached, _stamps([record for _, _, record in cached])):
+		if stamp == current:
+			stats.count('shared_hits')
+			local.set(record.id, data)
+			found[record.id] = record
+
+	missing = [post_id for post_id in post_ids if post_id not in found]
+
+	if len(missing) > 0:
+		stats.count_many('shared_misses', len(missing))
+
+		reddit = get_reddit()
+		records = []
+
+		for chunk in chunks(missing, 100):
+			records.extend(PostRecord.from_submission(submission) for submission in reddit.info(fullnames=[f't3_{post_id}' for post_id in chunk]))
+
+		entries = {}
+
+		for record, stamp in zip(records, _stamps(records)):
+			data = record.to_bytes()
+			entries[_post_key(record.id)] = (stamp, data)
+			local.set(record.id, data)
+			found[record.id] = record
+
+		cache.set_many(entries, how_long)
+
+	return [found[post_id] for post_id in post_ids if post_id in found]
+
+
+# Overwrites the cached copies of posts we know changed on reddit, in every worker
+def replace_cached(records, how_long=60 * 60 * 24 * 7):
+	if len(records) == 0:
+		return
+
+	_check_epoch()
+
+	cache.set_many({
+		_post_key(record.id): (stamp, record.to_bytes())
+		for record, stamp in zip(records, _stamps(records))
+	}, how_long)
+
+	_publish(posts=[record.id for record in records])
+
+
+# Ensures that when I vote or hide a post, it will be re-downloaded with
+# updated flags whenever I reload the page, in every worker
+def wipe_cache(post_id):
+	_check_epoch()
+	cache.delete(_post_key(post_id))
+	_publish(posts=[post_id])
+
+
+# The invalidate_*() functions only bump a counter, so they cost the same no matter how many posts are in the
+# shared cache, workers only drop the posts of that story or author from their local tier
+def invalidate_story(story):
+	bump(_generation_key(_story_scope(story.author.username, story.subreddit)))
+	_publish(scopes=[(story.author.username.lower(), story.subreddit.lower())])
+
+
+def invalidate_author(author):
+	bump(_generation_key(_author_scope(author.username)))
+	_publish(scopes=[(author.username.lower(), None)])
+
+
+def invalidate_all():
+	bump(_generation_key(GLOBAL_SCOPE))
+	_bump_epoch()
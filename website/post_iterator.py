@@ -0,0 +1,104 @@
+import heapq
+from collections import deque
+
+from django.utils.termcolors import colorize
+from prawcore import Forbidden
+
+from .records import PostRecord
+
+
+# A PostCursor wanted a post that more reading cursors already pushed out of the window
+class CursorFellBehind(IndexError):
+	pass
+
+
+# The whole reason this class even exists is because of this issue
+# https://www.reddit.com/r/redditdev/comments/oheh52/submissionsnew_returns_pinned_posts_out_of_order/
+# We can not request posts in strict time order because pinned posts are always first, even ANCIENT ones
+# So pinned posts are held back until we get an unpinned one that's older, everything else streams straight through
+#
+# Only the last `window` posts are kept, iterating again (or from another consumer) starts at the oldest of
+# those and continues with posts that haven't been fetched yet, so walking 10000 posts takes no more memory than 100
+# A cursor that is more than `window` posts behind the one reading ahead raises CursorFellBehind, it can't
+# be resumed without skipping posts, start a new one (or use a bigger window) instead
+class PostIterator:
+	def __init__(self, iterator, window=1000):
+		self.iterator = iterator
+		self.window = deque(maxlen=window)
+		# Index (counted from the first post we ever returned) of window[0]
+		self.start = 0
+		# Posts read but not returned yet, a heap on (-created_utc, read order)
+		self.held = []
+		self.read = 0
+		# created_utc of the oldest unpinned post read so far, nothing newer can still show up
+		self.boundary = None
+		self.done = False
+
+	def __iter__(self):
+		return PostCursor(self, self.start)
+
+	# The post at `index`, fetching more posts when needed
+	def get(self, index):
+		while index >= self.start + len(self.window):
+			if not self.release_next():
+				raise StopIteration
+
+		if index < self.start:
+			raise CursorFellBehind(f'post {index} has already left the window of {self.window.maxlen} posts, the oldest one left is post {self.start}')
+
+		return self.window[index - self.start]
+
+	# Moves the newest held post into the window, as soon as no newer post can show up anymore
+	# Returns False when there are no posts left
+	def release_next(self):
+		while True:
+			if len(self.held) > 0 and (self.done or (self.boundary is not None and -self.held[0][0] >= self.boundary)):
+				_, _, post = heapq.heappop(self.held)
+
+				if len(self.window) == self.window.maxlen:
+					self.start += 1
+
+				self.window.append(post)
+				return True
+
+			if self.done:
+				return False
+
+			self.read_next()
+
+	def read_next(self):
+		# praw fetches a page of 100 at a time
+		if self.read % 100 == 0:
+			print(colorize(f'requesting page for {self.iterator.url} with {self.iterator.params}', fg='yellow'))
+
+		try:
+			# Straight from the listing and never from the post cache, a crawl has to see edits, see crawler.store_page()
+			post = PostRecord.from_submission(next(self.iterator))
+		except StopIteration:
+			self.done = True
+			return
+		except Forbidden as e:
+			print(f'Got HTTP Forbidden while getting {self.iterator.url}, either he/she or we have been banned, please check and or remove')
+			raise e
+
+		heapq.heappush(self.held, (-post.created_utc, self.read, post))
+		self.read += 1
+
+		if not (post.pinned or post.stickied):
+			self.boundary = post.created_utc
+
+
+# One pass over a PostIterator, any number of these can read the same PostIterator
+class PostCursor:
+	def __init__(self, posts, index):
+		self.posts = posts
+		self.index = index
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		post = self.posts.get(self.index)
+		self.index += 1
+
+		return post
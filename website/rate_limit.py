@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Every request to reddit, from every worker and crawler, takes a token from one bucket in the shared cache
+# The bucket holds REDDIT_REQUESTS_PER_MINUTE tokens a minute, or fewer when reddit's rate limit headers
+# say the budget is running out before it resets
+#
+# Background work (crawls, /all, revalidation) may only use part of every minute, the rest is kept for
+# interactive requests (votes, story pages), so those don't queue behind a crawl:
+#
+# with rate_limit.priority(rate_limit.BACKGROUND):
+# 	sync_author(author)
+#
+# Interactive requests wait at most REDDIT_INTERACTIVE_WAIT seconds for the budget, after that they raise
+# BudgetExhausted (wrapped in a prawcore RequestException by praw), pages then show what is stored and
+# everything else answers 503, see middleware.RedditBudget, background work waits as long as it takes
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# The requests per minute that reddit's headers allow right now, expires when reddit's window resets
+RATE_KEY = 'reddit-budget:rate'
+
+_local = threading.local()
+
+
+# The budget would only allow this request after the longest wait its thread accepts
+class BudgetExhausted(Exception):
+	pass
+
+
+# Is `e` (or the exception praw wrapped) a BudgetExhausted?
+def is_exhausted(e):
+	return isinstance(e, BudgetExhausted) or isinstance(getattr(e, 'original_exception', None), BudgetExhausted)
+
+
+@contextmanager
+def priority(level):
+	previous = getattr(_local, 'priority', INTERACTIVE)
+	_local.priority = level
+
+	try:
+		yield
+	finally:
+		_local.priority = previous
+
+
+def current_priority():
+	return getattr(_local, 'priority', INTERACTIVE)
+
+
+# How long acquire() may wait in this thread, None for as long as it takes, overrides the default of the priority
+@contextmanager
+def max_wait(seconds):
+	previous = getattr(_local, 'max_wait', False)
+	_local.max_wait = seconds
+
+	try:
+		yield
+	finally:
+		if previous is False:
+			del _local.max_wait
+		else:
+			_local.max_wait = previous
+
+
+# How long the current thread may wait for reddit, or for someone else's request to reddit, None for as long as it takes
+def wait_limit():
+	return _max_wait(current_priority())
+
+
+def _max_wait(level):
+	if hasattr(_local, 'max_wait'):
+		return _local.max_wait
+
+	if level == INTERACTIVE:
+		return getattr(settings, 'REDDIT_INTERACTIVE_WAIT', 2)
+
+	return None
+
+
+def _limit(level):
+	per_minute = getattr(settings, 'REDDIT_REQUESTS_PER_MINUTE', 100)
+	rate = min(cache.get(RATE_KEY, per_minute), per_minute)
+
+	if level == BACKGROUND:
+		return rate * (1 - getattr(settings, 'REDDIT_INTERACTIVE_SHARE', 0.25))
+
+	return rate
+
+
+# Waits until the current thread may send a request to reddit, raises BudgetExhausted when that takes too long
+def acquire():
+	level = current_priority()
+	wait = _max_wait(level)
+	deadline = None if wait is None else time.monotonic() + wait
+
+	while True:
+		minute = int(time.time() // 60)
+		key = f'reddit-budget:{minute}'
+
+		cache.add(key, 0, 2 * 60)
+		used = cache.incr(key)
+
+		if used <= _limit(level):
+			return
+
+		# Give the token back, it would otherwise count against requests that are still allowed
+		cache.decr(key)
+
+		pause = (minute + 1) * 60 - time.time()
+
+		if deadline is not None and time.monotonic() + pause > deadline:
+			raise BudgetExhausted(f'Reddit budget for this minute is used up, {level} request would wait {pause:.0f}s')
+
+		print(f'Reddit budget for this minute is used up, {level} request waits')
+		time.sleep(pause)
+
+
+# Lowers the rate when reddit says we would run out before its window resets (praw reads the same headers)
+def update(headers):
+	if 'x-ratelimit-remaining' not in headers or 'x-ratelimit-reset' not in headers:
+		return
+
+	remaining = float(headers['x-ratelimit-remaining'])
+	reset = max(int(headers['x-ratelimit-reset']), 1)
+
+	cache.set(RATE_KEY, remaining / reset * 60, reset)
@@ -0,0 +1,92 @@
+import marshal
+
+# Bump this whenever FIELDS changes, cache entries written with another version are treated as missing
+RECORD_VERSION = 1
+
+# Everything the views, templates, crawler and ebook builder read from a reddit post
+FIELDS = (
+	'id',
+	'title',
+	'author',
+	'subreddit',
+	'created_utc',
+	'selftext_html',
+	'url',
+	'likes',
+	'hidden',
+	'removed_by_category',
+	'edited',
+	'num_comments',
+	'pinned',
+	'stickied',
+)
+
+
+# A username that can stand in for a praw Redditor, `post.author.name` and `str(post.author)` both work
+class RedditorName(str):
+	@property
+	def name(self):
+		return str(self)
+
+
+# A plain copy of the parts of a praw Submission we use
+# Unlike a pickled Submission it has no lazy loading and no reference to the reddit client,
+# so it is small and quick to (de)serialize
+class PostRecord:
+	# fixed_title, upvotable and is_read are filled in when matching posts to stories
+	__slots__ = FIELDS + ('fixed_title', 'upvotable', 'is_read')
+
+	def __init__(self, *values):
+		for field, value in zip(FIELDS, values):
+			setattr(self, field, value)
+
+		self.author = RedditorName(self.author)
+
+	def __eq__(self, other):
+		return isinstance(other, PostRecord) and self.id == other.id
+
+	def __hash__(self):
+		return hash(self.id)
+
+	def __repr__(self):
+		return f'<PostRecord {self.id} {self.title!r}>'
+
+	@classmethod
+	def from_submission(cls, submission):
+		# deleted accounts have no author
+		author = submission.author.name if submission.author is not None else '[deleted]'
+
+		return cls(
+			submission.id,
+			submission.title,
+			author,
+			str(submission.subreddit),
+			submission.created_utc,
+			submission.selftext_html,
+			submission.url,
+			submission.likes,
+			bool(submission.hidden),
+			submission.removed_by_category,
+			submission.edited,
+			submission.num_comments,
+			bool(submission.pinned),
+			bool(submission.stickied),
+		)
+
+	# marshal is the quickest serializer python has for a tuple of plain values, the version up front
+	# lets us recognize entries from an older layout (or an older python)
+	def to_bytes(self):
+		return marshal.dumps((RECORD_VERSION, *(str(self.author) if field == 'author' else getattr(self, field) for field in FIELDS)))
+
+	# Returns None for anything that isn't a record of the current version
+	@classmethod
+	def from_bytes(cls, data):
+		try:
+			values = marshal.loads(data)
+		except (EOFError, ValueError, TypeError):
+			return None
+
+		if not isinstance(values, tuple) or len(values) != len(FIELDS) + 1 or values[0] != RECORD_VERSION:
+			return None
+
+		return cls(*values[1:])
@@ -0,0 +1,112 @@
+import threading
+import weakref
+
+import praw
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import rate_limit
+
+# praw.Reddit objects are not thread safe, so every thread gets its own, but they all share one
+# HTTP connection pool
+# Every client has its own OAuth token (prawcore doesn't let clients share authorizers), so clients outlive
+# their threads: when a thread ends its client goes back to a pool and the next new thread takes it from there,
+# request threads and thread pools that come and go don't read praw.ini and fetch a new token every time
+#
+# Tests can swap in a fake:
+# set_reddit_factory(lambda **kwargs: FakeReddit())
+# ...
+# set_reddit_factory(None)
+
+_local = threading.local()
+_lock = threading.Lock()
+
+_shared = {
+	'session': None,
+	'factory': None,
+	# Bumped by set_reddit_factory(), so threads drop the clients they made with the old factory
+	'generation': 0,
+	# Clients whose threads ended, for new threads to take
+	'idle': [],
+}
+
+
+# Every request any client sends goes through here, so this is where the shared budget is enforced
+class BudgetedSession(requests.Session):
+	def request(self, method, url, *args, **kwargs):
+		rate_limit.acquire()
+
+		response = super().request(method, url, *args, **kwargs)
+		rate_limit.update(response.headers)
+
+		return response
+
+
+# Works without django settings too, e.g. in the unit tests
+def _setting(name, default):
+	return getattr(settings, name, default) if settings.configured else default
+
+
+# The HTTP session every client uses, also usable for plain requests to reddit
+def get_session():
+	with _lock:
+		if _shared['session'] is None:
+			# One connection per fetch thread, reddit is only ever two hosts (www and oauth)
+			pool_size = _setting('REDDIT_POOL_SIZE', _setting('REDDIT_FETCH_WORKERS', 8))
+			adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+
+			session = BudgetedSession()
+			session.mount('https://', adapter)
+			_shared['session'] = session
+
+		return _shared['session']
+
+
+def _make_reddit():
+	factory = _shared['factory']
+
+	if factory is not None:
+		return factory(requestor_kwargs={'session': get_session()})
+
+	return praw.Reddit(requestor_kwargs={'session': get_session()})
+
+
+# A thread's hold on its client, it goes away with the thread's locals and then puts the client back in the pool
+class _Lease:
+	def __init__(self, reddit, generation):
+		self.reddit = reddit
+		self.generation = generation
+
+		weakref.finalize(self, _give_back, reddit, generation).atexit = False
+
+
+def _give_back(reddit, generation):
+	with _lock:
+		if generation == _shared['generation'] and len(_shared['idle']) < _setting('REDDIT_POOL_SIZE', 10):
+			_shared['idle'].append(reddit)
+
+
+# The reddit client for this thread
+def get_reddit():
+	lease = getattr(_local, 'lease', None)
+
+	if lease is None or lease.generation != _shared['generation']:
+		with _lock:
+			generation = _shared['generation']
+			reddit = _shared['idle'].pop() if len(_shared['idle']) > 0 else None
+
+		if reddit is None:
+			reddit = _make_reddit()
+
+		lease = _local.lease = _Lease(reddit, generation)
+
+	return lease.reddit
+
+
+# `factory` is called with the same keyword arguments as praw.Reddit, None goes back to praw.Reddit
+def set_reddit_factory(factory):
+	with _lock:
+		_shared['factory'] = factory
+		_shared['generation'] += 1
+		_shared['idle'] = []
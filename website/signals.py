@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .matching import clear_matchers
+from .model_story import Story
+from .model_title_rule import TitleRule
+from .title_rules import rules_changed
+
+
+# Edited stories get new matchers anyway, this just stops old ones from piling up
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+def story_changed(sender, **kwargs):
+	clear_matchers()
+
+
+@receiver(post_save, sender=TitleRule)
+@receiver(post_delete, sender=TitleRule)
+def title_rule_changed(sender, **kwargs):
+	rules_changed()
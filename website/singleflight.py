@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+
+# One fetch that is in progress in this process, the threads waiting for it share its outcome
+class _Call:
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+# Someone else's fn() for the key wasn't done within the `wait` the caller gave
+class Timeout(Exception):
+	pass
+
+
+# Runs fn() once for every group of concurrent callers that use the same key, they all get its result
+# (or its exception), like golang's singleflight
+#
+# With `lookup` the processes coordinate too, through a lock in the shared cache:
+# only the process holding the lock runs fn(), the others wait for the lock to go away and then
+# call lookup() to read whatever fn() stored, lookup() returns None when there is nothing to read
+# fn() still runs when nothing shows up within `lock_timeout` seconds, e.g. because the other process died
+#
+# Callers that can't wait that long (page loads) pass `wait`, after that many seconds of waiting for another
+# thread or process they get a Timeout instead, and can show what they have
+#
+# Example:
+# record = singleflight.do(f'post:{id}', fetch_and_store, lookup=read_stored)
+def do(key, fn, lookup=None, lock_timeout=60, poll_interval=0.1, wait=None):
+	with _calls_lock:
+		call = _calls.get(key)
+		leader = call is None
+
+		if leader:
+			call = _calls[key] = _Call()
+
+	if not leader:
+		if not call.done.wait(wait):
+			raise Timeout(f'{key} was not done within {wait}s')
+
+		if call.error is not None:
+			raise call.error
+
+		return call.result
+
+	try:
+		call.result = _do_shared(key, fn, lookup, lock_timeout, poll_interval, wait)
+		return call.result
+	except BaseException as e:
+		call.error = e
+		raise
+	finally:
+		with _calls_lock:
+			del _calls[key]
+
+		call.done.set()
+
+
+def _do_shared(key, fn, lookup, lock_timeout, poll_interval, wait):
+	if lookup is None:
+		return fn()
+
+	lock_key = f'singleflight:{key}'
+	deadline = time.monotonic() + lock_timeout
+	give_up = deadline if wait is None else min(deadline, time.monotonic() + wait)
+	waited = False
+
+	while not cache.add(lock_key, 1, lock_timeout):
+		waited = True
+
+		while cache.get(lock_key) is not None and time.monotonic() < give_up:
+			time.sleep(poll_interval)
+
+		value = lookup()
+		if value is not None:
+			return value
+
+		if time.monotonic() >= deadline:
+			return fn()
+
+		if time.monotonic() >= give_up:
+			raise Timeout(f'another process was still busy with {key} after {wait}s')
+
+	locked_at = time.monotonic()
+
+	try:
+		# Another process may have finished while we waited, a caller that got the lock right away
+		# has only just seen the miss, so it skips the extra lookup
+		if waited:
+			value = lookup()
+			if value is not None:
+				return value
+
+		return fn()
+	finally:
+		# Only our own lock, once it has expired someone else may hold it
+		if time.monotonic() - locked_at < lock_timeout:
+			cache.delete(lock_key)
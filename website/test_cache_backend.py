@@ -0,0 +1,127 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from .cache_backend import SQLiteCache
+
+
+class TestSQLiteCache(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.cache = self.make_cache()
+
+	def tearDown(self):
+		self.cache.connection.close()
+		self.directory.cleanup()
+
+	def make_cache(self, **options):
+		return SQLiteCache(Path(self.directory.name) / 'cache.sqlite3', {'OPTIONS': options})
+
+	def test_get_set(self):
+		self.cache.set('a', {'b': [1, 2]})
+		self.cache.set('bytes', b'\x00\x01')
+		self.cache.set('bool', True)
+
+		self.assertEqual(self.cache.get('a'), {'b': [1, 2]})
+		self.assertEqual(self.cache.get('bytes'), b'\x00\x01')
+		self.assertIs(self.cache.get('bool'), True)
+		self.assertIsNone(self.cache.get('missing'))
+		self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+	def test_many(self):
+		self.cache.set_many({'a': 1, 'b': 'two', 'c': b'3'})
+
+		self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd']), {'a': 1, 'b': 'two', 'c': b'3'})
+
+		self.cache.delete_many(['a', 'b'])
+
+		self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'c': b'3'})
+
+	def test_expiry(self):
+		self.cache.set('a', 1, timeout=-1)
+		self.cache.set('b', 1, timeout=None)
+
+		self.assertIsNone(self.cache.get('a'))
+		self.assertFalse(self.cache.has_key('a'))
+		self.assertTrue(self.cache.has_key('b'))
+
+		# add() only replaces expired entries
+		self.assertTrue(self.cache.add('a', 2))
+		self.assertFalse(self.cache.add('a', 3))
+		self.assertEqual(self.cache.get('a'), 2)
+
+	def test_incr(self):
+		self.cache.set('n', 1)
+
+		self.assertEqual(self.cache.incr('n'), 2)
+		self.assertEqual(self.cache.decr('n', 5), -3)
+		self.assertEqual(self.cache.get('n'), -3)
+
+		with self.assertRaises(ValueError):
+			self.cache.incr('missing')
+
+	def test_clear(self):
+		self.cache.set_many({'a': 1, 'b': 2})
+		self.cache.clear()
+
+		self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+	def test_evicts_least_recently_used(self):
+		cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+		cache.set_many({f'old{i}': i for i in range(10)})
+
+		# Make the old entries look unused for a while, then use half of them
+		cache.connection.execute('UPDATE cache SET accessed = ?', (time.time() - 3600,))
+		cache.get_many([f'old{i}' for i in range(5)])
+
+		cache.set('new', 1)
+		cache.cull()
+
+		left = cache.get_many([f'old{i}' for i in range(10)] + ['new'])
+
+		self.assertLessEqual(len(left), 10)
+		self.assertIn('new', left)
+		self.assertEqual({f'old{i}' for i in range(5)}, {key for key in left if key.startswith('old')})
+
+	def test_max_size(self):
+		cache = self.make_cache(MAX_SIZE=10000)
+		cache.set_many({f'k{i}': b'x' * 1000 for i in range(30)})
+		cache.cull()
+
+		self.assertLess(len(cache.get_many([f'k{i}' for i in range(30)])), 10)
+
+	def test_running_totals(self):
+		def totals():
+			return self.cache.connection.execute('SELECT entries, size FROM cache_stats').fetchone()
+
+		def counted():
+			return self.cache.connection.execute('SELECT COUNT(*), TOTAL(size) FROM cache').fetchone()
+
+		self.cache.set_many({'a': b'x' * 100, 'b': 1, 'c': 'three'})
+		self.cache.set('a', b'x' * 10)
+		self.cache.add('d', 'four')
+		self.cache.add('d', 'replaced')
+		self.cache.incr('b')
+		self.cache.delete('c')
+		self.cache.set('e', 1, timeout=-1)
+		self.cache.cull()
+
+		self.assertEqual(totals(), (3, counted()[1]))
+
+		self.cache.clear()
+
+		self.assertEqual(totals(), (0, 0))
+
+	def test_counts_existing_entries(self):
+		self.cache.set_many({'a': b'x' * 100, 'b': 2})
+		self.cache.connection.execute('DROP TABLE cache_stats')
+
+		cache = self.make_cache()
+
+		self.assertEqual(cache.connection.execute('SELECT entries FROM cache_stats').fetchone()[0], 2)
+		cache.connection.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from .chapter_index import ChapterIndex, describe_gaps
+from .helpers import DotDict
+
+
+def fake_post(post_id, fixed_title, created_utc):
+	return DotDict({'id': post_id, 'fixed_title': fixed_title, 'created_utc': created_utc})
+
+
+class TestChapterIndex(unittest.TestCase):
+	def setUp(self):
+		self.index = ChapterIndex([
+			fake_post('e', 'Story - Chapter 5', 50),
+			fake_post('a', 'Story - Chapter 1', 10),
+			fake_post('b', 'Story - Chapter 2', 20),
+			fake_post('b2', 'Story - Chapter 2 (repost)', 25),
+			fake_post('x', 'Story - Interlude', 30),
+			fake_post('f', 'Story - Chapter 6.5', 60),
+		])
+
+	def ids(self, posts):
+		return [post.id for post in posts]
+
+	def test_next_unread(self):
+		self.assertEqual(self.ids(self.index.next_unread(2, None)), ['a', 'b'])
+		self.assertEqual(self.ids(self.index.next_unread(10, 25)), ['x', 'e', 'f'])
+		self.assertEqual(self.index.next_unread(10, 60), [])
+
+	def test_chapters(self):
+		self.assertEqual(self.ids(self.index.chapters(2, 5)), ['b', 'b2', 'e'])
+		self.assertEqual(self.ids(self.index.chapters(6, 7)), ['f'])
+		self.assertEqual(self.index.chapters(100, 200), [])
+
+	def test_gaps_and_duplicates(self):
+		self.assertEqual(self.index.gaps(), [(3, 4)])
+		self.assertEqual({number: self.ids(posts) for number, posts in self.index.duplicates().items()}, {2: ['b', 'b2']})
+
+	def test_first_contact(self):
+		index = ChapterIndex([
+			fake_post('a', 'FC - 20220101T1200 - Chapter 40', 10),
+			fake_post('b', 'FC - 20220102T1200', 20),
+			fake_post('c', 'FC - 20220103T1200 - Chapter 42', 30),
+		])
+
+		self.assertEqual(self.ids(index.chapters(40, 42)), ['a', 'c'])
+		self.assertEqual(index.gaps(), [(41, 41)])
+
+	def test_outliers_are_not_gaps(self):
+		index = ChapterIndex([
+			fake_post('a', 'Story - Chapter 1', 10),
+			fake_post('b', 'Story - Chapter 4', 20),
+			fake_post('c', 'Story - Chapter 7', 30),
+			fake_post('d', 'Story - Chapter 2019', 40),
+		])
+
+		self.assertEqual(index.gaps(), [(2, 3), (5, 6)])
+
+	def test_describe_gaps(self):
+		self.assertEqual(describe_gaps([(3, 3), (7, 9)]), ['3', '7-9'])
+		self.assertEqual(describe_gaps([(n, n) for n in range(0, 30, 2)], limit=3), ['0', '2', '4', '12 more'])
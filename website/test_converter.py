@@ -0,0 +1,69 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from .converter import ConversionService, ConverterBusy
+
+
+# A stand-in for ebook-convert that copies its input after sleeping for as many seconds as the input says
+@unittest.skipIf(sys.platform == 'win32', 'needs a shebang script')
+class TestConversionService(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.dir.name, 'fake-ebook-convert')
+
+		with open(self.path, 'w') as f:
+			f.write(f'#!{sys.executable}\n')
+			f.write('import shutil, sys, time\n')
+			f.write('time.sleep(float(open(sys.argv[1]).read()))\n')
+			f.write('shutil.copy(sys.argv[1], sys.argv[2])\n')
+
+		os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IEXEC)
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def book(self, name, seconds):
+		source = os.path.join(self.dir.name, f'{name}.epub')
+
+		with open(source, 'w') as f:
+			f.write(str(seconds))
+
+		return source, f'{source}.azw3'
+
+	def test_convert(self):
+		service = ConversionService(self.path, 1, 0, 10)
+		source, target = self.book('a', 0)
+
+		service.convert(source, target)
+
+		self.assertTrue(os.path.exists(target))
+		self.assertEqual(service.stats()['timings']['convert']['count'], 1)
+
+	def test_full_queue_fails_fast(self):
+		service = ConversionService(self.path, 1, 0, 10)
+		slow = threading.Thread(target=service.convert, args=self.book('slow', 1))
+		slow.start()
+
+		try:
+			while service.stats()['running'] == 0:
+				time.sleep(0.01)
+
+			with self.assertRaises(ConverterBusy):
+				service.convert(*self.book('b', 0))
+		finally:
+			slow.join()
+
+		self.assertEqual(service.stats()['rejected'], 1)
+
+	def test_timeout(self):
+		service = ConversionService(self.path, 1, 1, 0.5)
+
+		with self.assertRaises(TimeoutError):
+			service.convert(*self.book('c', 5))
+
+		self.assertEqual(service.stats()['running'], 0)
@@ -0,0 +1,57 @@
+import random
+import unittest
+
+from fuzzywuzzy import fuzz
+
+from .fuzzy import partial_ratio_cdist
+
+
+class TestPartialRatioCdist(unittest.TestCase):
+	titles = [
+		'First Contact - Chapter 12',
+		'The Nature of Predators 94',
+		'Sexy Space Babes: Chapter Twenty One',
+		'Contact',
+		'',
+	]
+	fragments = [
+		'First Contact',
+		'The Nature of Predators',
+		'Space Babes',
+		'First Contact - Chapter 12 and a lot more',
+		'',
+	]
+
+	def test_same_scores_as_partial_ratio(self):
+		scores = partial_ratio_cdist(self.titles, self.fragments)
+
+		for t, title in enumerate(self.titles):
+			for f, fragment in enumerate(self.fragments):
+				self.assertEqual(scores[t][f], fuzz.partial_ratio(fragment, title), (fragment, title))
+
+	def test_cutoff_gives_same_decisions(self):
+		rng = random.Random(80)
+		alphabet = 'abcde fGHI'
+
+		def random_string(longest):
+			return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, longest)))
+
+		titles = [random_string(40) for _ in range(50)]
+		fragments = [random_string(15) for _ in range(10)]
+		cutoffs = [rng.randint(1, 100) for _ in fragments]
+
+		scores = partial_ratio_cdist(titles, fragments, cutoffs)
+
+		for t, title in enumerate(titles):
+			for f, fragment in enumerate(fragments):
+				expected = fuzz.partial_ratio(fragment, title)
+
+				self.assertEqual(scores[t][f] >= cutoffs[f], expected >= cutoffs[f], (fragment, title))
+
+				# Anything that passes the cutoff has its exact score
+				if expected >= cutoffs[f]:
+					self.assertEqual(scores[t][f], expected)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,9 +1,12 @@
 import datetime
+import threading
+import time
 import unittest
 
 from pathlib import Path
 
-from .helpers import replaceTextnumberWithNumber, find_common_prefix, DotDict, get_ebook_name_from_list_of_posts
+from .helpers import replaceTextnumberWithNumber, find_common_prefix, DotDict, get_ebook_name_from_list_of_posts, LRUCache, \
+	submission_id_from_url, is_share_url, map_within, split_covered, advance_high_water_marks, lower_high_water_marks
 
 
 class TestReplaceTextnumberWithNumber(unittest.TestCase):
@@ -59,6 +62,35 @@ class TestFindCommonPrefix(unittest.TestCase):
 		with self.assertRaises(ValueError):
 			find_common_prefix('a', 'b')
 
+class TestLRUCache(unittest.TestCase):
+	def test_forgets_least_recently_used(self):
+		lru = LRUCache(2)
+		lru.set('a', 1)
+		lru.set('b', 2)
+
+		# touching a makes b the oldest
+		self.assertEqual(lru.get('a'), 1)
+		lru.set('c', 3)
+
+		self.assertEqual(lru.get('a'), 1)
+		self.assertIsNone(lru.get('b'))
+		self.assertEqual(lru.get('c'), 3)
+		self.assertEqual(len(lru), 2)
+
+	def test_max_bytes(self):
+		lru = LRUCache(10, max_bytes=5)
+		lru.set('a', b'123')
+		lru.set('b', b'45')
+		lru.set('c', b'6')
+
+		self.assertIsNone(lru.get('a'))
+		self.assertEqual(lru.bytes, 3)
+
+		lru.delete('b')
+
+		self.assertEqual(lru.bytes, 1)
+		self.assertEqual(len(lru), 1)
+
 def fake_post_maker(title, when):
 	return DotDict({
 		'title': title,
@@ -66,6 +98,23 @@ def fake_post_maker(title, when):
 		'created_utc': datetime.datetime.strptime(when, "%Y-%m-%d %H:%M:%S").timestamp(),
 	})
 
+class TestSubmissionIdFromUrl(unittest.TestCase):
+	def test_urls(self):
+		self.assertEqual(submission_id_from_url('https://www.reddit.com/r/HFY/comments/abc123/some_title/'), 'abc123')
+		self.assertEqual(submission_id_from_url('https://old.reddit.com/comments/ABC123'), 'abc123')
+		self.assertEqual(submission_id_from_url('reddit.com/user/someone/comments/abc123?utm_source=share'), 'abc123')
+		self.assertEqual(submission_id_from_url(' https://redd.it/abc123 '), 'abc123')
+
+	def test_not_submissions(self):
+		self.assertIsNone(submission_id_from_url('https://www.reddit.com/r/HFY/'))
+		self.assertIsNone(submission_id_from_url('https://example.com/comments/abc123'))
+		self.assertIsNone(submission_id_from_url('https://www.reddit.com/r/HFY/s/AbCdEf123'))
+
+	def test_share_urls(self):
+		self.assertTrue(is_share_url('https://www.reddit.com/r/HFY/s/AbCdEf123'))
+		self.assertFalse(is_share_url('https://redd.it/abc123'))
+
+
 class TestGetEbookNameFromListOfPosts(unittest.TestCase):
 	# No number in both names, pick older post as final name
 	def test_no_number(self):
@@ -127,3 +176,107 @@ class TestGetEbookNameFromListOfPosts(unittest.TestCase):
 
 if __name__ == '__main__':
 	unittest.main()
+
+
+class TestMapWithin(unittest.TestCase):
+	def test_partial_results(self):
+		release = threading.Event()
+
+		def fetch(item):
+			if item == 'slow':
+				release.wait(5)
+			if item == 'broken':
+				raise ValueError(item)
+
+			return item.upper()
+
+		start = time.monotonic()
+		results, skipped = map_within(fetch, ['a', 'slow', 'broken', 'b', 'queued'], 2, 0.5)
+		release.set()
+
+		self.assertLess(time.monotonic() - start, 2)
+		self.assertEqual(sorted(results), [('a', 'A'), ('b', 'B'), ('queued', 'QUEUED')])
+		self.assertEqual(sorted((item, type(reason).__name__) for item, reason in skipped), [('broken', 'ValueError'), ('slow', 'str')])
+
+	def test_unstarted_items_are_cancelled(self):
+		started = []
+		release = threading.Event()
+
+		def fetch(item):
+			started.append(item)
+			release.wait(5)
+
+			return item
+
+		results, skipped = map_within(fetch, range(5), 1, 0.3)
+		release.set()
+
+		self.assertEqual(results, [])
+		self.assertEqual(len(skipped), 5)
+		self.assertEqual(started, [0])
+
+
+def fake_author(pk, synced_at, newest_post_id=None, newest_created_utc=None):
+	return DotDict(pk=pk, synced_at=synced_at, newest_post_id=newest_post_id, newest_created_utc=newest_created_utc)
+
+
+class TestSubredditCoverage(unittest.TestCase):
+	def setUp(self):
+		self.previous = datetime.datetime(2024, 1, 1, 12)
+		self.fresh = fake_author(1, self.previous + datetime.timedelta(minutes=5), 'f1', 100)
+		self.stale = fake_author(2, self.previous - datetime.timedelta(hours=1), 's1', 100)
+		self.unmarked = fake_author(3, self.previous + datetime.timedelta(minutes=5))
+		self.new = fake_author(4, None)
+
+	def test_covered_when_reached_and_up_to_date(self):
+		covered, behind = split_covered([self.fresh, self.stale, self.unmarked, self.new], True, self.previous)
+
+		self.assertEqual(covered, [self.fresh])
+		self.assertEqual(behind, [self.stale, self.unmarked])
+
+	# A listing that ended before the last sync missed posts, nobody is covered
+	def test_nobody_covered_when_not_reached(self):
+		covered, behind = split_covered([self.fresh, self.stale, self.new], False, self.previous)
+
+		self.assertEqual(covered, [])
+		self.assertEqual(behind, [self.fresh, self.stale])
+
+	def test_nobody_covered_on_the_first_sync(self):
+		covered, behind = split_covered([self.fresh], True, None)
+
+		self.assertEqual(covered, [])
+		self.assertEqual(behind, [self.fresh])
+
+	def test_advance_only_to_newer_posts(self):
+		newest_of = {1: DotDict(id='f2', created_utc=200), 2: DotDict(id='s0', created_utc=50), 3: DotDict(id='u1', created_utc=10)}
+
+		moved = advance_high_water_marks([self.fresh, self.stale, self.unmarked, self.new], newest_of)
+
+		self.assertEqual(moved, [self.fresh, self.unmarked])
+		self.assertEqual((self.fresh.newest_post_id, self.fresh.newest_created_utc), ('f2', 200))
+		self.assertEqual((self.stale.newest_post_id, self.stale.newest_created_utc), ('s1', 100))
+		self.assertEqual((self.unmarked.newest_post_id, self.unmarked.newest_created_utc), ('u1', 10))
+
+	def test_lower_to_the_previous_mark(self):
+		low = fake_author(5, self.previous, 'l1', 20)
+
+		moved = lower_high_water_marks([self.fresh, low, self.unmarked], 'p1', 50)
+
+		self.assertEqual(moved, [self.fresh])
+		self.assertEqual((self.fresh.newest_post_id, self.fresh.newest_created_utc), ('p1', 50))
+		self.assertEqual((low.newest_post_id, low.newest_created_utc), ('l1', 20))
+
+	def test_lower_without_previous_mark_clears(self):
+		moved = lower_high_water_marks([self.fresh, self.unmarked], None, None)
+
+		self.assertEqual(moved, [self.fresh])
+		self.assertEqual((self.fresh.newest_post_id, self.fresh.newest_created_utc), (None, None))
+
+	# An author in two subreddits: the listing of the first moved its mark past posts the second one missed,
+	# lowering it again makes the author's own sync walk back over them
+	def test_gap_in_another_subreddit(self):
+		advance_high_water_marks(split_covered([self.fresh], True, self.previous)[0], {1: DotDict(id='f3', created_utc=300)})
+		_, behind = split_covered([self.fresh], False, self.previous)
+		lower_high_water_marks(behind, 'p2', 150)
+
+		self.assertEqual((self.fresh.newest_post_id, self.fresh.newest_created_utc), ('p2', 150))
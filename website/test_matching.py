@@ -0,0 +1,136 @@
+import random
+import unittest
+
+from .helpers import DotDict
+from .matching import StoryMatcher, MultiStoryMatcher, StoryIndex, get_story_matcher
+
+
+def fake_story_maker(title_fragment, is_regex=False, is_fuzzy=False, fuzzy_ratio=80, subreddit='HFY'):
+	return DotDict({
+		'subreddit': subreddit,
+		'title_fragment': title_fragment,
+		'is_regex': is_regex,
+		'is_fuzzy': is_fuzzy,
+		'fuzzy_ratio': fuzzy_ratio,
+	})
+
+
+def fake_post_maker(title, subreddit='HFY'):
+	return DotDict({
+		'title': title,
+		'subreddit': subreddit,
+	})
+
+
+class TestStoryMatcher(unittest.TestCase):
+	def test_plain(self):
+		matcher = StoryMatcher(fake_story_maker('First Contact'))
+
+		self.assertTrue(matcher.matches(fake_post_maker('first contact - Chapter 12')))
+		self.assertFalse(matcher.matches(fake_post_maker('Last Contact - Chapter 12')))
+
+	def test_plain_is_not_a_regex(self):
+		matcher = StoryMatcher(fake_story_maker('Chapter (1)'))
+
+		self.assertTrue(matcher.matches(fake_post_maker('Chapter (1)')))
+		self.assertFalse(matcher.matches(fake_post_maker('Chapter 1')))
+
+	def test_regex(self):
+		matcher = StoryMatcher(fake_story_maker(r'^Ch\. \d+$', is_regex=True))
+
+		self.assertTrue(matcher.matches(fake_post_maker('ch. 12')))
+		self.assertFalse(matcher.matches(fake_post_maker('Ch. 12 part 2')))
+
+	def test_fuzzy(self):
+		matcher = StoryMatcher(fake_story_maker('The Nature of Predators', is_fuzzy=True))
+
+		self.assertTrue(matcher.matches(fake_post_maker('The Nature of Predator 94')))
+		self.assertFalse(matcher.matches(fake_post_maker('Sexy Space Babes: Chapter 9')))
+
+	def test_subreddit(self):
+		matcher = StoryMatcher(fake_story_maker('First Contact', subreddit='hfy'))
+
+		self.assertTrue(matcher.matches(fake_post_maker('First Contact', subreddit='HFY')))
+		self.assertFalse(matcher.matches(fake_post_maker('First Contact', subreddit='WritingPrompts')))
+
+
+class TestMultiStoryMatcher(unittest.TestCase):
+	def setUp(self):
+		self.matcher = MultiStoryMatcher([
+			fake_story_maker('First Contact'),
+			fake_story_maker('Chapter'),
+			fake_story_maker('Sexy Space Babes'),
+		])
+
+	def test_match_all(self):
+		self.assertEqual(self.matcher.match(fake_post_maker('First Contact - Chapter 1')), [0, 1])
+		self.assertEqual(self.matcher.match(fake_post_maker('Sexy Space Babes')), [2])
+		self.assertEqual(self.matcher.match(fake_post_maker('Nothing')), [])
+
+	def test_match_active(self):
+		self.assertEqual(self.matcher.match(fake_post_maker('First Contact - Chapter 1'), [1, 2]), [1])
+
+
+class TestRememberedMatches(unittest.TestCase):
+	def test_edited_story_is_matched_again(self):
+		story = fake_story_maker('First Contact')
+		post = fake_post_maker('First Contact - Chapter 1')
+
+		self.assertEqual(MultiStoryMatcher([story]).match(post), [0])
+		self.assertIs(get_story_matcher(story), get_story_matcher(fake_story_maker('First Contact')))
+
+		story.title_fragment = 'Last Contact'
+
+		self.assertEqual(MultiStoryMatcher([story]).match(post), [])
+
+		story.title_fragment = 'first contact'
+		story.is_fuzzy = True
+
+		self.assertEqual(MultiStoryMatcher([story]).match(post), [0])
+
+
+class TestStoryIndex(unittest.TestCase):
+	def test_required_text(self):
+		self.assertEqual(StoryMatcher(fake_story_maker('First Contact')).required_text(), 'First Contact')
+		self.assertEqual(StoryMatcher(fake_story_maker(r'^Ch\. \d+', is_regex=True)).required_text(), 'Ch. ')
+		self.assertEqual(StoryMatcher(fake_story_maker(r'abc?', is_regex=True)).required_text(), 'ab')
+		self.assertIsNone(StoryMatcher(fake_story_maker(r'a|b', is_regex=True)).required_text())
+		self.assertIsNone(StoryMatcher(fake_story_maker('First Contact', is_fuzzy=True)).required_text())
+
+	def test_candidates(self):
+		index = StoryIndex([
+			StoryMatcher(fake_story_maker('First Contact')),
+			StoryMatcher(fake_story_maker('Sexy Space Babes')),
+			StoryMatcher(fake_story_maker('Nature of Predators', is_fuzzy=True)),
+			StoryMatcher(fake_story_maker('ab')),
+		])
+
+		# fuzzy and too short to index are always candidates
+		self.assertEqual(index.candidates('FIRST CONTACT - Chapter 1'), {0, 2, 3})
+		self.assertEqual(index.candidates('Nothing to see here'), {2, 3})
+
+	# The index may let through stories that don't match, but never drop one that does
+	def test_never_misses_a_match(self):
+		rng = random.Random(6)
+		alphabet = 'abcAB .\u0131\u017f\u212a\u0130'
+
+		def random_string(longest):
+			return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, longest)))
+
+		for _ in range(200):
+			stories = [fake_story_maker(random_string(6)) for _ in range(12)]
+			stories += [fake_story_maker(random_string(4) + '.*', is_regex=True) for _ in range(4)]
+
+			matcher = MultiStoryMatcher(stories)
+			self.assertIsNotNone(matcher.index)
+
+			for _ in range(20):
+				post = fake_post_maker(random_string(30))
+				expected = [i for i, m in enumerate(matcher.matchers) if m.matches(post)]
+
+				self.assertEqual(matcher.match(post), expected)
+				self.assertEqual(matcher.match_page([post]), [expected])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,41 @@
+import random
+import unittest
+
+from nltk.tokenize import NLTKWordTokenizer
+
+from .numberwords import find_chunks, chunks_from_tokens, replace_number_words, _NEEDS_NLTK
+
+PIECES = [
+	'one', 'Two', 'seventeen', 'seven', 'hundred', 'THOUSAND', 'ninety', 'someone', 'often', 'Chapter', 'Part',
+	'2', '10', '-', '--', ',', ':', '(', ')', '[', ']', ';', '&', '?', '!', '*', '/', '+', '<', '>', '#', '_',
+]
+SEPARATORS = ['', ' ', ' ', '  ', '\t']
+
+
+class TestFindChunks(unittest.TestCase):
+	def test_same_chunks_as_nltk(self):
+		rng = random.Random(1337)
+		tokenizer = NLTKWordTokenizer()
+		checked = 0
+
+		while checked < 5000:
+			text = ''.join(rng.choice(PIECES) + rng.choice(SEPARATORS) for _ in range(rng.randint(1, 12))).lower()
+
+			# The rest goes through nltk itself
+			if _NEEDS_NLTK.search(text) is not None:
+				continue
+
+			self.assertEqual(find_chunks(text), chunks_from_tokens(tokenizer.tokenize(text)), text)
+			checked += 1
+
+	def test_chunks(self):
+		self.assertEqual(find_chunks('chapter one hundred twenty (part two)'), ['one hundred twenty', 'two'])
+		self.assertEqual(find_chunks('one-hundred-four, someone'), [])
+		self.assertEqual(find_chunks('one,2 two:three'), ['two', 'three'])
+
+
+class TestReplaceNumberWords(unittest.TestCase):
+	def test_replace(self):
+		self.assertEqual(replace_number_words('Chapter Twenty (End of Book One)'), 'Chapter 20 (End of Book 1)')
+		self.assertEqual(replace_number_words('Nothing to see here'), 'Nothing to see here')
+		self.assertEqual(replace_number_words('The Seven Days of Fire'), 'The Seven Days of Fire')
@@ -0,0 +1,91 @@
+import unittest
+from types import SimpleNamespace
+
+from .post_iterator import CursorFellBehind, PostIterator
+
+
+def submission(id, created_utc, pinned=False):
+	return SimpleNamespace(
+		id=id, title=id, author=SimpleNamespace(name='someone'), subreddit='hfy', created_utc=created_utc,
+		selftext_html=None, url='', likes=None, hidden=False, removed_by_category=None, edited=False,
+		num_comments=0, pinned=pinned, stickied=False,
+	)
+
+
+# Stands in for a praw ListingGenerator, counts how many submissions were read
+class Listing:
+	url = '/r/hfy/new'
+	params = {}
+
+	def __init__(self, submissions):
+		self.submissions = iter(submissions)
+		self.read = 0
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		post = next(self.submissions)
+		self.read += 1
+
+		return post
+
+
+def ids(posts):
+	return [post.id for post in posts]
+
+
+class TestPostIterator(unittest.TestCase):
+	def test_newest_first(self):
+		listing = Listing([submission(f'p{i}', 100 - i) for i in range(5)])
+
+		self.assertEqual(ids(PostIterator(listing)), ['p0', 'p1', 'p2', 'p3', 'p4'])
+
+	def test_pinned_posts_are_held_back(self):
+		# Reddit lists pinned posts first, however old they are
+		listing = Listing([submission('old', 10, pinned=True), submission('new', 35, pinned=True)] + [submission(f'p{i}', 50 - i * 10) for i in range(5)])
+		posts = iter(PostIterator(listing))
+
+		self.assertEqual(next(posts).id, 'p0')
+		# Nothing past the first unpinned post was read to return it
+		self.assertEqual(listing.read, 3)
+		self.assertEqual(ids(posts), ['p1', 'new', 'p2', 'p3', 'old', 'p4'])
+
+	def test_pinned_posts_at_the_end(self):
+		listing = Listing([submission('pinned', 5, pinned=True), submission('p0', 20), submission('p1', 10)])
+
+		self.assertEqual(ids(PostIterator(listing)), ['p0', 'p1', 'pinned'])
+
+	def test_window(self):
+		posts = PostIterator(Listing([submission(f'p{i}', 100 - i) for i in range(10)]), window=3)
+
+		self.assertEqual(len(ids(posts)), 10)
+		self.assertEqual(len(posts.window), 3)
+		# Iterating again starts at the oldest post still kept
+		self.assertEqual(ids(posts), ['p7', 'p8', 'p9'])
+
+	def test_cursors_share_the_listing(self):
+		listing = Listing([submission(f'p{i}', 100 - i) for i in range(10)])
+		posts = PostIterator(listing, window=5)
+		first = iter(posts)
+		second = iter(posts)
+
+		self.assertEqual([next(first).id for _ in range(4)], ['p0', 'p1', 'p2', 'p3'])
+		self.assertEqual([next(second).id for _ in range(6)], ['p0', 'p1', 'p2', 'p3', 'p4', 'p5'])
+		self.assertEqual(ids(first), ['p4', 'p5', 'p6', 'p7', 'p8', 'p9'])
+		# Every submission was read from reddit once
+		self.assertEqual(listing.read, 10)
+
+	def test_cursor_that_fell_behind(self):
+		posts = PostIterator(Listing([submission(f'p{i}', 100 - i) for i in range(10)]), window=3)
+		behind = iter(posts)
+		next(behind)
+
+		self.assertEqual(len(ids(posts)), 10)
+
+		with self.assertRaises(CursorFellBehind):
+			next(behind)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,62 @@
+import marshal
+import pickle
+import unittest
+
+from .helpers import DotDict
+from .records import PostRecord, RECORD_VERSION, FIELDS
+
+
+def fake_submission_maker(**kwargs):
+	submission = DotDict({
+		'id': 'oheh52',
+		'title': 'First Contact - Chapter 12',
+		'author': DotDict({'name': 'Ralts_Bloodthorne'}),
+		'subreddit': 'HFY',
+		'created_utc': 1625000000.0,
+		'selftext_html': '<p>Hello</p>',
+		'url': 'https://www.reddit.com/r/HFY/comments/oheh52/',
+		'likes': None,
+		'hidden': False,
+		'removed_by_category': None,
+		'edited': False,
+		'num_comments': 42,
+		'pinned': False,
+		'stickied': False,
+	})
+	submission.update(kwargs)
+
+	return submission
+
+
+class TestPostRecord(unittest.TestCase):
+	def test_round_trip(self):
+		record = PostRecord.from_submission(fake_submission_maker(likes=True, edited=1625000100.0))
+		copy = PostRecord.from_bytes(record.to_bytes())
+
+		for field in FIELDS:
+			self.assertEqual(getattr(copy, field), getattr(record, field), field)
+
+		self.assertEqual(copy.author.name, 'Ralts_Bloodthorne')
+		self.assertEqual(str(copy.author), 'Ralts_Bloodthorne')
+		self.assertEqual(copy, record)
+		self.assertEqual(len({copy, record}), 1)
+
+	def test_deleted_author(self):
+		record = PostRecord.from_submission(fake_submission_maker(author=None))
+
+		self.assertEqual(record.author.name, '[deleted]')
+
+	def test_other_versions_are_ignored(self):
+		record = PostRecord.from_submission(fake_submission_maker())
+		values = marshal.loads(record.to_bytes())
+
+		self.assertIsNone(PostRecord.from_bytes(marshal.dumps((RECORD_VERSION + 1, *values[1:]))))
+		self.assertIsNone(PostRecord.from_bytes(marshal.dumps(values[:-1])))
+
+		# What the cache held before records existed
+		self.assertIsNone(PostRecord.from_bytes(pickle.dumps(fake_submission_maker())))
+		self.assertIsNone(PostRecord.from_bytes(b''))
+
+
+if __name__ == '__main__':
+	unittest.main()
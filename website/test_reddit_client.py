@@ -0,0 +1,44 @@
+import os
+import threading
+import unittest
+from unittest import mock
+
+import praw
+
+from . import reddit_client
+
+
+# Real praw clients, built from made up credentials, nothing is sent to reddit
+@mock.patch.dict(os.environ, {'praw_client_id': 'id', 'praw_client_secret': 'secret', 'praw_user_agent': 'tests'})
+class TestGetReddit(unittest.TestCase):
+	def setUp(self):
+		reddit_client.set_reddit_factory(None)
+
+	def test_praw_client(self):
+		reddit = reddit_client.get_reddit()
+
+		self.assertIsInstance(reddit, praw.Reddit)
+		self.assertIs(reddit_client.get_reddit(), reddit)
+		self.assertIs(reddit._core.requestor._http, reddit_client.get_session())
+
+	def in_thread(self, fn):
+		results = []
+		thread = threading.Thread(target=lambda: results.append(fn()))
+		thread.start()
+		thread.join()
+
+		return results[0]
+
+	def test_threads_share_the_session(self):
+		other = self.in_thread(lambda: (reddit_client.get_reddit(), self.in_thread(reddit_client.get_reddit)))
+		reddit = reddit_client.get_reddit()
+
+		self.assertIsNot(other[0], other[1])
+		self.assertIs(other[0]._core.requestor._http, other[1]._core.requestor._http)
+		self.assertIs(reddit._core.requestor._http, reddit_client.get_session())
+
+	def test_clients_outlive_their_threads(self):
+		first = self.in_thread(reddit_client.get_reddit)
+		second = self.in_thread(reddit_client.get_reddit)
+
+		self.assertIs(first, second)
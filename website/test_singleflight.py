@@ -0,0 +1,150 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from . import singleflight
+from .cache_backend import SQLiteCache
+
+
+class TestSingleFlight(unittest.TestCase):
+	def run_together(self, n, target):
+		results = [None] * n
+
+		def run(i):
+			results[i] = target()
+
+		threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+
+		for thread in threads:
+			thread.start()
+
+		for thread in threads:
+			thread.join()
+
+		return results
+
+	def test_concurrent_calls_share_one_run(self):
+		calls = []
+		release = threading.Event()
+
+		def fetch():
+			calls.append(1)
+			release.wait(5)
+			return 'result'
+
+		def call():
+			return singleflight.do('key', fetch)
+
+		threading.Timer(0.2, release.set).start()
+		results = self.run_together(5, call)
+
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(results, ['result'] * 5)
+
+	def test_exception_reaches_every_caller(self):
+		errors = []
+
+		def fetch():
+			time.sleep(0.1)
+			raise ValueError('reddit is down')
+
+		def call():
+			try:
+				singleflight.do('failing', fetch)
+			except ValueError as e:
+				errors.append(e)
+
+		self.run_together(3, call)
+
+		self.assertEqual(len(errors), 3)
+
+	def test_follower_gives_up_after_wait(self):
+		release = threading.Event()
+		leader = threading.Thread(target=lambda: singleflight.do('slow', lambda: release.wait(5)))
+		leader.start()
+		time.sleep(0.1)
+
+		started = time.monotonic()
+
+		with self.assertRaises(singleflight.Timeout):
+			singleflight.do('slow', lambda: 'not run', wait=0.1)
+
+		self.assertLess(time.monotonic() - started, 1)
+
+		release.set()
+		leader.join()
+
+	def test_later_calls_run_again(self):
+		self.assertEqual(singleflight.do('key', lambda: 1), 1)
+		self.assertEqual(singleflight.do('key', lambda: 2), 2)
+
+
+# Two caches on one file stand in for two processes sharing the django cache
+class TestSingleFlightAcrossProcesses(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		path = Path(self.directory.name) / 'cache.sqlite3'
+
+		self.ours = SQLiteCache(path, {})
+		self.other = SQLiteCache(path, {})
+
+		self.previous = singleflight.cache
+		singleflight.cache = self.ours
+
+	def tearDown(self):
+		singleflight.cache = self.previous
+		self.ours.connection.close()
+		self.other.connection.close()
+		self.directory.cleanup()
+
+	def test_waits_for_the_other_process(self):
+		calls = []
+
+		# The other process is fetching the same post
+		self.other.add('singleflight:post', 1, 30)
+
+		def other_finishes():
+			self.other.set('post', 'stored by the other process')
+			self.other.delete('singleflight:post')
+
+		threading.Timer(0.3, other_finishes).start()
+
+		result = singleflight.do('post', lambda: calls.append(1), lookup=lambda: self.ours.get('post'), poll_interval=0.05)
+
+		self.assertEqual(result, 'stored by the other process')
+		self.assertEqual(calls, [])
+
+	def test_runs_when_the_other_process_stored_nothing(self):
+		self.other.add('singleflight:post', 1, 30)
+		threading.Timer(0.2, lambda: self.other.delete('singleflight:post')).start()
+
+		result = singleflight.do('post', lambda: 'fetched', lookup=lambda: self.ours.get('post'), poll_interval=0.05)
+
+		self.assertEqual(result, 'fetched')
+		self.assertIsNone(self.other.get('singleflight:post'))
+
+	def test_gives_up_after_wait(self):
+		self.other.add('singleflight:post', 1, 30)
+		started = time.monotonic()
+
+		with self.assertRaises(singleflight.Timeout):
+			singleflight.do('post', lambda: 'fetched', lookup=lambda: self.ours.get('post'), lock_timeout=30, poll_interval=0.05, wait=0.2)
+
+		self.assertLess(time.monotonic() - started, 1)
+		# The other process still holds its lock
+		self.assertIsNotNone(self.other.get('singleflight:post'))
+
+	def test_single_caller_takes_and_releases_the_lock(self):
+		lookups = []
+
+		def fetch():
+			self.assertIsNotNone(self.other.get('singleflight:post'))
+			return 'fetched'
+
+		result = singleflight.do('post', fetch, lookup=lambda: lookups.append(1))
+
+		self.assertEqual(result, 'fetched')
+		self.assertEqual(lookups, [])
+		self.assertIsNone(self.other.get('singleflight:post'))
@@ -0,0 +1,50 @@
+import datetime
+import unittest
+
+from .title_rules import DEFAULT_RULES, TitlePipeline, applies_to, rule_from_dict
+
+CREATED = 1650000000.0
+
+
+def pipeline(author_name, subreddit='hfy', extra=()):
+	rules = [rule_from_dict(rule) for rule in DEFAULT_RULES] + list(extra)
+	return TitlePipeline([rule for rule in rules if applies_to(rule, author_name, subreddit)])
+
+
+class TestTitlePipeline(unittest.TestCase):
+	def test_default_rules(self):
+		created = datetime.datetime.fromtimestamp(CREATED)
+
+		cases = [
+			('Chapter 12', 'ralts_bloodthorne', f'FC - {created:%Y%m%dT%H%M} - Chapter 12'),
+			('[OC] HoH Part 2', 'tigra21', ' HoH Part 2'),
+			('HoH 3', 'tigra21', 'Hunter or Huntress 3'),
+			('HoH 3', 'someone', 'HoH 3'),
+			('[OC] Tales From the Terran Republic: Part 4', 'someone', f'TFtTR {created:%Y-%m-%dT%H%M} - : Part 4'),
+			('The Nature of Predators 44...', 'someone', 'The Nature of Predators 44'),
+		]
+
+		for title, author_name, expected in cases:
+			self.assertEqual(pipeline(author_name).apply(title, CREATED), expected)
+
+	def test_version_only_changes_for_affected_authors(self):
+		extra = [rule_from_dict(dict(author='Tigra21', pattern='Part', replacement='Pt'))]
+
+		self.assertEqual(pipeline('someone').version, pipeline('someone', extra=extra).version)
+		self.assertNotEqual(pipeline('tigra21').version, pipeline('tigra21', extra=extra).version)
+		self.assertEqual(pipeline('tigra21', extra=extra).apply('HoH 3 Part 2', CREATED), 'Hunter or Huntress 3 Pt 2')
+
+	def test_subreddit_rules(self):
+		extra = [rule_from_dict(dict(subreddit='HFY', pattern='^', replacement='[hfy] '))]
+
+		self.assertEqual(pipeline('someone', 'hfy', extra).apply('Title', CREATED), '[hfy] Title')
+		self.assertEqual(pipeline('someone', 'other', extra).apply('Title', CREATED), 'Title')
+
+	def test_braces_are_literal(self):
+		created = datetime.datetime.fromtimestamp(CREATED)
+		extra = [
+			rule_from_dict(dict(pattern='^', replacement='{x} {} {created:%Y} {created:')),
+			rule_from_dict(dict(pattern='Title', replacement=r'\9')),
+		]
+
+		self.assertEqual(pipeline('someone', extra=extra).apply('Title', CREATED), f'{{x}} {{}} {created:%Y} {{created:Title')
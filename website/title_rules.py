@@ -0,0 +1,215 @@
+import datetime
+import functools
+import hashlib
+import re
+import string
+import threading
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.termcolors import colorize
+
+from .generations import bump
+from .numberwords import replace_number_words
+
+# Post titles are rewritten by an ordered list of rules stored in the TitleRule table (editable in the admin),
+# rules can be limited to one author or subreddit, so a new author quirk is a new row and not new code
+#
+# The rules that apply to an (author, subreddit) are compiled once into a TitlePipeline, its version is a hash
+# of those rules, so editing a Tigra21 rule only gives Tigra21's titles a new version and leaves everyone else's
+# rewritten titles where they are
+#
+# settings.TITLE_RULES (a list like DEFAULT_RULES) replaces the table when it is set,
+# without django settings (the unit tests) DEFAULT_RULES are used
+#
+# Example:
+# rewrite_title('[OC] HoH Part Two', 'Tigra21', 'hfy', 1650000000.0)
+
+# Bump this when the meaning of a rule changes (a new kind, different number words), it's part of every version
+ENGINE_VERSION = 2
+
+# Saving or deleting a rule bumps this, every worker reloads the rules when it sees it change
+GENERATION_KEY = 'title-rules-generation'
+
+# How often (seconds) a worker asks the shared cache whether the rules were changed
+CHECK_INTERVAL = 5
+
+# What helpers.standardize_title did before the rules were data, the 0015 migration stores these in the table
+DEFAULT_RULES = [
+	{'kind': 'printable'},
+	{'kind': 'number_words'},
+	{'pattern': r'^\.+|\.+$'},
+	{'pattern': r'(.*)Tales From the Terran Republic(.*)', 'replacement': r'TFtTR {created:%Y-%m-%dT%H%M} - \1 \2', 'ignore_case': True},
+	{'pattern': r'\[OP\]', 'replacement': ' '},
+	{'pattern': r'\[OC\]', 'replacement': ' '},
+	{'pattern': r'[\[\]]', 'replacement': ' '},
+	{'pattern': r' +', 'replacement': ' '},
+	{'pattern': r'Story Continuation'},
+	{'pattern': r'^ Serial '},
+	{'author': 'Ralts_Bloodthorne', 'pattern': r'^(?=Chapter)', 'replacement': 'First Contact - '},
+	# He stopped numbering his posts on 2022-01-10, and therefore I started adding datestamps
+	# Sometimes this absolute mad lad posts multiple times per hour, so that's the that is required
+	{'author': 'Ralts_Bloodthorne', 'condition': r'^First Contact', 'pattern': r'First Contact', 'replacement': 'FC - {created:%Y%m%dT%H%M}'},
+	{'author': 'Tigra21', 'condition': r'^HoH[\s\S]', 'pattern': r'HoH', 'replacement': 'Hunter or Huntress'},
+]
+
+_PRINTABLE = set(string.printable)
+
+# `{created}` or `{created:<strftime format>}` in a replacement is the post's date, any other brace is just a brace
+DATE_TOKEN = re.compile(r'\{created(?::([^{}]*))?\}')
+
+# Replacements are checked with this date, see CompiledRule
+SAMPLE_DATE = datetime.datetime(2000, 1, 1)
+
+
+# `replacement` with its date tokens filled in with `created`
+def expand_dates(replacement, created):
+	return DATE_TOKEN.sub(lambda match: format(created, match.group(1) or ''), replacement)
+
+
+# A rule from a dict like the ones in DEFAULT_RULES, with the TitleRule defaults for anything left out
+def rule_from_dict(rule):
+	return SimpleNamespace(**{
+		'kind': 'sub', 'author': '', 'subreddit': '', 'condition': '', 'pattern': '', 'replacement': '', 'ignore_case': False,
+		**rule,
+	})
+
+
+# Everything about a rule that changes what it does to a title
+def rule_revision(rule):
+	return (
+		rule.kind, rule.author.lower(), rule.subreddit.lower(), rule.condition,
+		rule.pattern, rule.replacement, rule.ignore_case,
+	)
+
+
+def applies_to(rule, author_name, subreddit):
+	return rule.author.lower() in ('', author_name) and rule.subreddit.lower() in ('', subreddit)
+
+
+class CompiledRule:
+	def __init__(self, rule):
+		self.kind = rule.kind
+		self.condition = re.compile(rule.condition) if rule.condition else None
+		self.pattern = re.compile(rule.pattern, re.IGNORECASE if rule.ignore_case else 0)
+		self.replacement = rule.replacement
+		self.uses_date = DATE_TOKEN.search(rule.replacement) is not None
+
+		# A bad group reference would otherwise fail on every title, re.sub checks the template even without a match
+		if self.kind == 'sub':
+			self.pattern.sub(expand_dates(self.replacement, SAMPLE_DATE), '')
+
+	def apply(self, title, created):
+		if self.condition is not None and self.condition.search(title) is None:
+			return title
+
+		if self.kind == 'printable':
+			return ''.join(c for c in title if c in _PRINTABLE)
+
+		if self.kind == 'number_words':
+			return replace_number_words(title)
+
+		replacement = expand_dates(self.replacement, created) if self.uses_date else self.replacement
+
+		return self.pattern.sub(replacement, title)
+
+
+# The rules for one (author, subreddit), in order, compiled once
+class TitlePipeline:
+	def __init__(self, rules):
+		revisions = [rule_revision(rule) for rule in rules]
+
+		self.version = hashlib.sha1(repr((ENGINE_VERSION, revisions)).encode()).hexdigest()[:12]
+		self.rules = []
+
+		for rule in rules:
+			try:
+				self.rules.append(CompiledRule(rule))
+			except (re.error, ValueError) as e:
+				print(colorize(f'Skipping title rule {rule}: {e}', fg='red'))
+
+	def __eq__(self, other):
+		return isinstance(other, TitlePipeline) and self.version == other.version
+
+	def __hash__(self):
+		return hash(self.version)
+
+	def apply(self, title, created_utc):
+		created = datetime.datetime.fromtimestamp(created_utc)
+
+		for rule in self.rules:
+			title = rule.apply(title, created)
+
+		return title
+
+
+# Every enabled rule, and the pipelines made from them by (author, subreddit)
+_state = {'rules': None, 'generation': None, 'checked_at': 0, 'pipelines': {}}
+_lock = threading.Lock()
+
+
+def _load_rules():
+	if not settings.configured:
+		return [rule_from_dict(rule) for rule in DEFAULT_RULES]
+
+	if getattr(settings, 'TITLE_RULES', None) is not None:
+		return [rule_from_dict(rule) for rule in settings.TITLE_RULES]
+
+	from .models import TitleRule
+
+	return list(TitleRule.objects.filter(enabled=True))
+
+
+# Reloads the rules if any worker changed them since we last looked, returns the rules and their pipelines
+def _current():
+	now = time.monotonic()
+
+	with _lock:
+		if _state['rules'] is not None and now - _state['checked_at'] < CHECK_INTERVAL:
+			return _state['rules'], _state['pipelines']
+
+	generation = cache.get(GENERATION_KEY) if settings.configured else None
+
+	with _lock:
+		if _state['rules'] is None or generation != _state['generation']:
+			_state['rules'] = _load_rules()
+			_state['pipelines'] = {}
+			_state['generation'] = generation
+
+		_state['checked_at'] = now
+
+		return _state['rules'], _state['pipelines']
+
+
+def pipeline_for(author_name, subreddit):
+	author_name = author_name.lower()
+	subreddit = subreddit.lower()
+
+	rules, pipelines = _current()
+	pipeline = pipelines.get((author_name, subreddit))
+
+	if pipeline is None:
+		pipeline = TitlePipeline([rule for rule in rules if applies_to(rule, author_name, subreddit)])
+		pipelines[(author_name, subreddit)] = pipeline
+
+	return pipeline
+
+
+def rewrite_title(title, author_name, subreddit, created_utc):
+	return _rewrite(pipeline_for(author_name, subreddit), title, created_utc)
+
+
+# Only depends on its arguments, so it's remembered, a new version of the rules is a different pipeline
+@functools.lru_cache(maxsize=100000)
+def _rewrite(pipeline, title, created_utc):
+	return pipeline.apply(title, created_utc)
+
+
+# Called whenever a rule is saved or deleted, makes every worker reload the rules
+def rules_changed():
+	bump(GENERATION_KEY)
+
+	with _lock:
+		_state['rules'] = None
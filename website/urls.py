@@ -15,6 +15,7 @@ urlpatterns = [
 	path('textbook', views.textbook, name='textbook'),
 	path('bookify', views.bookify, name='bookify'),
 	path('get_n_chapter_as_ebook/<int:story_id>/', views.get_n_chapter_as_ebook, name='get_n_chapter_as_ebook'),
+	path('status/', views.status, name='status'),
 	path('favicon.ico', RedirectView.as_view(url=staticfiles_storage.url('favicon.png'))),
 
 	path('nuke_cache/', views.nuke_cache, name='nuke_cache'),
@@ -1,12 +1,12 @@
 import datetime
+import functools
 import logging
 import os
-import pickle
 import re
 
+import time
 import uuid
 from contextlib import contextmanager
-from subprocess import Popen, PIPE
 import tempfile
 import textwrap
 
@@ -15,162 +15,83 @@ import praw
 import textile
 
 from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection
 from django.utils.termcolors import colorize
 from django.http import HttpResponse
-from prawcore import Forbidden, ResponseException
-from fuzzywuzzy import fuzz
+from prawcore import PrawcoreException
 
 from ebooklib import epub
 
-from .helpers import replaceTextnumberWithNumber, sort_posts, generate_filename_for_post, standardize_title, DotDict
-from .models import Story
+from . import rate_limit
+from .converter import ConverterBusy, get_converter
+from .matching import get_multi_story_matcher
+from .helpers import replaceTextnumberWithNumber, sort_posts, chunks, generate_filename_for_post, standardize_title, DotDict, \
+	submission_id_from_url, is_share_url, map_within
+from .models import Story, Post
+from .post_cache import get_or_set_cache, get_or_set_cache_many, wipe_cache
+from .reddit_client import get_reddit, get_session
+from .post_iterator import PostCursor, PostIterator
+from .records import PostRecord
 
 from django.core.cache import cache
+from django.db.models import Q
 
 logger = logging.getLogger(__name__)
 
 
-def get_or_set_cache(post, how_long=60 * 60 * 24 * 7):
-	c = cache.get(post.id)
-
-	if c is not None:
-		c2 = pickle.loads(c)
-		return c2
-
-	# make it non-lazy
-	_ = post.title
-
-	cache.set(post.id, pickle.dumps(post), how_long)
-
-	return post
-
-
-# Ensures that when I vote or hide a post, it will be re-downloaded with
-# updated flags whenever I reload the page
-def wipe_cache(post_id):
-	cache.delete(post_id)
-
-
-# The whole reason this class even exists is because of this issue
-# https://www.reddit.com/r/redditdev/comments/oheh52/submissionsnew_returns_pinned_posts_out_of_order/
-# We can not request posts in strict time order because pinned posts are always first
-# BUG: if an ANCIENT post is pinned (1000+ posts ago), it will still appear in the first 100 post list
-#      idea is to hold back ancient pinned posts until we get an unpinned one that's older
-class PostIterator:
-	def __init__(self, iterator):
-		self.iterator = iterator
-		self.storage = []
-		self.can_get_more = True
-
-	def __iter__(self):
-		self.element = -1
-		return self
-
-	def __next__(self):
-		self.element += 1
-
-		try:
-			return self.storage[self.element]
-		except IndexError:
-			if self.can_get_more:
-				batch = self.get_next_batch()
-				self.storage.extend(batch['posts'])
-				self.can_get_more = not batch['done']
-
-				if batch['done'] and len(batch['posts']) > 0:
-					raise Exception('IT CAN HAPPEN!')
-
-				if len(batch['posts']) > 0:
-					return self.storage[self.element]
-				else:
-					raise StopIteration
-			else:
-				raise StopIteration
-
-	def get_next_batch(self):
-		print(colorize(f'requesting page for {self.iterator.url} with {self.iterator.params}', fg='yellow'))
-		posts = []
-		done = False
-
-		try:
-			while True:
-				try:
-					post = get_or_set_cache(next(self.iterator))
-				except ResponseException as e:
-					raise e
-
-				post.__hash__ = hash(post.id)
-
-				posts.append(post)
-
-				# noinspection PyProtectedMember
-				if self.iterator._listing is None or (self.iterator._list_index + 1) > len(self.iterator._listing):
-					break
-		except Forbidden as e:
-			print(f'Got HTTP Forbidden while getting {self.iterator.url}, either he/she or we have been banned, please check and or remove')
-			raise e
-		except ResponseException as e:
-			print(f'########### {e}')
-			raise e
-		except StopIteration:
-			done = True
-
-		return {'posts': sort_posts(posts), 'done': done}
-
-
-def get_N_subscription_posts(iterator, subscription, how_many_liked_i_want):
+# Walks `iterator` (newest first) once, routing each post to every subscription it matches
+# Every subscription returns all of its unread posts, plus the newest `how_many_liked_i_want` read ones,
+# it stops looking at the first read post past that, and the walk stops once all of them have stopped
+def get_N_subscriptions_posts(iterator, subscriptions, how_many_liked_i_want):
+	matcher = get_multi_story_matcher(subscriptions)
+	upvoted = [0] * len(matcher)
+	active = list(range(len(matcher)))
 	results = set()
-	upvoted = 0
 
-	for post in iterator:
-		# deleted posts are ignored like this, there is no deleted bool that I found
-		if post.removed_by_category is not None:
-			continue
-
-		if post.subreddit != subscription.subreddit:
-			continue
+	# Posts are matched a page at a time, so that fuzzy stories can be scored in bulk
+	for page in chunks(iterator, 100):
+		if len(active) == 0:
+			break
 
-		# Title search method
-		# non-fuzzy stuff first
-		if subscription.is_regex or not subscription.is_fuzzy:
-			title = subscription.title_fragment
-			if not subscription.is_regex:
-				title = re.escape(title)
+		# deleted posts are ignored like this, there is no deleted bool that I found
+		page = [post for post in page if post.removed_by_category is None]
 
-			r = re.search(title, post.title, re.IGNORECASE)
-			if r is None:
-				continue
-		else:
-			# fuzzy stuff
-			result = fuzz.partial_ratio(subscription.title_fragment, post.title)
+		for post, matched in zip(page, matcher.match_page(page, active)):
+			# A story can stop halfway through the page
+			matched = [i for i in matched if i in active]
 
-			if result < subscription.fuzzy_ratio:
+			if len(matched) == 0:
 				continue
 
-		# if we got to this point, then this post is acceptable!
-		# if it is already in an upvoted state, count it, otherwise add it without counting it
+			# if we got to this point, then this post is acceptable!
+			# if it is already in an upvoted state, count it, otherwise add it without counting it
 
-		post.fixed_title = standardize_title(post)
-		post.upvotable = can_upvote(post)
+			post.fixed_title = standardize_title(post)
+			post.upvotable = can_upvote(post)
 
-		# What constitutes a post that is read?
-		# Upvoted, or Hidden
-		post.is_read = post.likes is True or post.hidden
+			# What constitutes a post that is read?
+			# Upvoted, or Hidden
+			post.is_read = post.likes is True or post.hidden
 
-		if post.is_read:
-			if upvoted < how_many_liked_i_want:
-				upvoted += 1
-				results.add(post)
-			else:
-				break
-		else:
-			results.add(post)
+			for i in matched:
+				if post.is_read:
+					if upvoted[i] < how_many_liked_i_want:
+						upvoted[i] += 1
+						results.add(post)
+					else:
+						active.remove(i)
+				else:
+					results.add(post)
 
 	return results
 
 
+# Reads posts from the local post store, the store is filled by `crawl_posts`
+# An author that has never been crawled is crawled right away
 def get_reddit_posts(author, story, how_many_likes_i_want=10):
-	reddit = praw.Reddit()
+	# imported here because crawler imports us
+	from .crawler import refresh_author
 
 	if story is not None:
 		subscriptions = [ story ]
@@ -184,12 +105,56 @@ def get_reddit_posts(author, story, how_many_likes_i_want=10):
 		print(f'FYI: {author} has no enabled subscriptions')
 		return results
 
-	iterator = PostIterator(reddit.redditor(author.username).submissions.new(limit=None))
+	refresh_author(author)
 
+	in_subreddits = Q()
 	for subscription in subscriptions:
-		results.update(get_N_subscription_posts(iterator, subscription, how_many_likes_i_want))
+		in_subreddits |= Q(subreddit__iexact=subscription.subreddit)
+
+	# Newest first, streamed a page at a time so that the walk stopping early also stops the reading,
+	# the bodies are only needed for ebooks, which load their posts again
+	posts = Post.objects.filter(in_subreddits, author=author).select_related('author').defer('selftext_html').iterator(chunk_size=100)
+
+	return sort_posts(get_N_subscriptions_posts(posts, subscriptions, how_many_likes_i_want))
+
 
-	return sort_posts(results)
+def _get_reddit_posts_in_thread(author, how_many_likes_i_want):
+	try:
+		# A page for all authors at once, it shouldn't use up the budget of single story pages,
+		# but it is still a page load, so it doesn't wait for the next minute either
+		with rate_limit.priority(rate_limit.BACKGROUND), rate_limit.max_wait(getattr(settings, 'REDDIT_INTERACTIVE_WAIT', 2)):
+			return get_reddit_posts(author, None, how_many_likes_i_want)
+	finally:
+		# Every worker thread gets its own database connection, don't leak them
+		connection.close()
+
+
+# Fetches posts for many authors at once with a bounded pool of worker threads
+# The whole page gets REDDIT_FETCH_TIMEOUT seconds, authors that raise or aren't done by then are skipped,
+# the ones that haven't started yet are cancelled, so one slow author can't hold up the page
+def get_reddit_posts_of_authors(authors, how_many_likes_i_want=10):
+	authors = list(authors)
+
+	if len(authors) == 0:
+		return []
+
+	timeout = getattr(settings, 'REDDIT_FETCH_TIMEOUT', 20)
+
+	results, skipped = map_within(
+		lambda author: _get_reddit_posts_in_thread(author, how_many_likes_i_want),
+		authors,
+		getattr(settings, 'REDDIT_FETCH_WORKERS', 8),
+		timeout,
+		errors=(PrawcoreException,),
+	)
+
+	for author, reason in skipped:
+		if reason == 'timeout':
+			print(colorize(f'{author} was not done within {timeout}s, skipping', fg='red'))
+		else:
+			print(colorize(f'{author} returned {reason!r}, skipping', fg='red'))
+
+	return sort_posts([post for _, posts in results for post in posts])
 
 
 def generate_ebook_from_plaintext(title, text):
@@ -222,6 +187,31 @@ def generate_ebook_from_plaintext(title, text):
 	)
 
 
+# Takes the links pasted into bookify and returns the ids of the posts they point to, in order, without duplicates
+# Only share links (reddit.com/r/sub/s/...) need a request, reddit has to tell us where they redirect to
+def get_submission_ids_from_urls(urls):
+	ids = []
+
+	for url in urls:
+		url = url.strip()
+
+		if len(url) == 0:
+			continue
+
+		post_id = submission_id_from_url(url)
+
+		if post_id is None and is_share_url(url):
+			response = get_session().head(url, allow_redirects=True, timeout=10, headers={'User-Agent': 'redditSub2Kindle'})
+			post_id = submission_id_from_url(response.url)
+
+		if post_id is None:
+			raise NotImplementedError(f'{url} is not a link to a reddit post')
+
+		ids.append(post_id)
+
+	return list(dict.fromkeys(ids))
+
+
 def get_posts_as_ebook(posts, title, author):
 	toc = []
 	book = create_empty_book(title, author)
@@ -232,11 +222,28 @@ def get_posts_as_ebook(posts, title, author):
 		'created_utc': datetime.datetime.utcnow().timestamp(),
 	}))
 
+	reddit = get_reddit()
+
+	# Anything that isn't stored yet is looked up in one go, instead of once per post
+	posts = list(posts)
+	records = {
+		record.id: record
+		for record in get_or_set_cache_many(p.id for p in posts if not isinstance(p, (Post, PostRecord)))
+	}
+
 	for p in posts:
-		post = get_or_set_cache(p)
+		post = p if isinstance(p, (Post, PostRecord)) else records.get(p.id)
+
+		if post is None:
+			print(colorize(f'Reddit does not know {p.id}, skipping', fg='red'))
+			continue
+
+		# Stored posts and records have everything but the comments, those still come from reddit
+		submission = reddit.submission(post.id)
+
 		print(f'Adding "{standardize_title(post)}" to book')
 
-		chapter, comments = post_to_chapter_and_comments(post)
+		chapter, comments = post_to_chapter_and_comments(post, submission)
 
 		book.add_item(chapter)
 		book.add_item(comments)
@@ -321,7 +328,7 @@ def create_empty_book(title, author):
 	return book
 
 
-def post_to_chapter_and_comments(post):
+def post_to_chapter_and_comments(post, submission):
 	dt = datetime.datetime.fromtimestamp(post.created_utc)
 
 	html = f'<div id="title">\n'
@@ -349,12 +356,12 @@ def post_to_chapter_and_comments(post):
 	chapter.add_link(href='styles.css', rel='stylesheet', type='text/css')
 
 	# Configure how we get post comments
-	post.comment_sort = 'best'
-	post.comment_limit = 10
-	post.comments.replace_more(limit=0)
+	submission.comment_sort = 'best'
+	submission.comment_limit = 10
+	submission.comments.replace_more(limit=0)
 
 	comments = epub.EpubHtml(title=post.title + ' Comments', file_name=f'{filename}.comments.html', lang='en')
-	comments.content = get_comment_forest_as_html(post, post.comments)
+	comments.content = get_comment_forest_as_html(submission, submission.comments)
 	comments.add_link(href='styles.css', rel='stylesheet', type='text/css')
 
 	return chapter, comments
@@ -375,30 +382,43 @@ def my_named_temporary_file(prefix, suffix):
 
 # This function takes in a `book` object and converts it to epub, which is written to a temp file
 # then that temp file is closed, and we use ebook-convert to convert it to azw3 so kindles can read it
-# That file then gets returned as file download
+# That file then gets returned as file download, or a 503 when too many books are being converted already
 def convert_book_to_epub_azw3_response(book, filename):
+	converter = get_converter()
+
 	with my_named_temporary_file(prefix='redditSub2KindleTMP-', suffix='.epub') as f1:
+		start = time.monotonic()
 		epub.write_epub(f1, book, {})
+		converter.record('write', time.monotonic() - start)
 
 		# Close the file so that ebook-convert can mess with it
 		f1.close()  # https://bugs.python.org/issue14243
 
-		process = Popen([ r'C:\\Program Files\\Calibre2\\ebook-convert.exe', f1.name, f'{f1.name}.azw3' ], stdout=PIPE, stderr=PIPE)
-		stdout, stderr = process.communicate()
-
-		if len(stderr) > 0:
-			raise BrokenPipeError(f'ebook-convert: {stderr.decode("utf-8")}')
-
-		# https://bugs.python.org/issue14243#msg164504
-		def temp_opener(name, flag, mode=0o444):
-			return os.open(name, flag | os.O_TEMPORARY, mode)
-
-		# f2 should be ready now
-		with open(f'{f1.name}.azw3', "rb", opener=temp_opener) as f2:
-			# We must respond appropriately for Kindle to prompt the user to download the file to documents
-			response = HttpResponse(f2.read(), content_type='application/octet-stream')
-			response['Content-Description'] = 'File Transfer'
-			response['Content-Disposition'] = f'attachment; filename="{filename}"'
+		try:
+			converter.convert(f1.name, f'{f1.name}.azw3')
+
+			start = time.monotonic()
+
+			# f2 should be ready now
+			with open(f'{f1.name}.azw3', 'rb') as f2:
+				# We must respond appropriately for Kindle to prompt the user to download the file to documents
+				response = HttpResponse(f2.read(), content_type='application/octet-stream')
+				response['Content-Description'] = 'File Transfer'
+				response['Content-Disposition'] = f'attachment; filename="{filename}"'
+		except ConverterBusy as e:
+			print(colorize(f'Not converting {filename}: {e}', fg='red'))
+
+			response = HttpResponse('Too many books are being made right now, try again in a minute', status=503)
+			response['Retry-After'] = '60'
+			return response
+		finally:
+			# ebook-convert may have left a half written file behind when it failed
+			try:
+				os.unlink(f'{f1.name}.azw3')
+			except OSError:
+				pass
+
+		converter.record('read', time.monotonic() - start)
 
 	return response
 
@@ -449,16 +469,23 @@ def get_comment_forest_as_html(post, forest, level=0) -> str:
 # I use upvote to "mark as read" but reddit annoyingly prevents upvoting after
 # 6 months, so this returns false for those, since I can then hide them instead
 def can_upvote(post):
+	return _can_upvote(str(post.subreddit).lower(), post.created_utc, datetime.date.today())
+
+
+# The answer only changes once a day, so it is remembered per day
+@functools.lru_cache(maxsize=100000)
+def _can_upvote(subreddit, created_utc, today):
 	# Reddit introduced commenting/upvoting archived posts on 2021-10-01 which makes this check redundant for communities
 	# that allow it... But there exists no mechanism to check if a community has it enabled except manual testing...
 	# https://www.reddit.com/r/blog/comments/pze6d2/commenting_on_archived_posts_images_in_chat_and/
 
 	# r/HFY has disabled post archiving 2021-10-17
 	# https://www.reddit.com/r/HFY/comments/pztdfk/meta_mods_enable_comments_and_votes_on_old_posts/
-	if post.subreddit == 'HFY':
+	if subreddit == 'hfy':
 		return True
 
-	posted_at = datetime.datetime.fromtimestamp(int(post.created_utc)).replace(hour=0, minute=0, second=0)
-	max_age = datetime.datetime.today() + relativedelta(months=-6)
+	# Whole days, from `today` and not the clock, so the remembered answer holds for the whole day
+	posted_on = datetime.date.fromtimestamp(int(created_utc))
+	max_age = today + relativedelta(months=-6)
 
-	return posted_at > max_age
+	return posted_on > max_age
@@ -1,13 +1,17 @@
+import math
 import time
 from collections import defaultdict
 
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.decorators.http import require_http_methods
-from prawcore import BadJSON
 
-from . import utils
+from .chapter_index import attach_read_state, describe_gaps, get_chapter_index, newest_read
+from .converter import get_converter_stats
 from .helpers import get_ebook_name_from_list_of_posts
 from .model_author import Author
+from .post_cache import get_cache_stats, invalidate_all, invalidate_story
+from .reddit_client import get_reddit
 from .utils import *
 
 
@@ -33,24 +37,18 @@ def get_list_of_subscriptions(request):
 # Gets unread posts for ALL stories
 @require_http_methods(["GET"])
 def get_all_posts_of_all_subscriptions(request):
-	authors = Author.ordered_objects.filter(enabled=True)
-
-	posts = []
+	authors = list(Author.ordered_objects.filter(enabled=True))
 
 	start = time.time()
 
-	for author in authors:
-		try:
-			sub_posts = get_reddit_posts(author, None, 0)
-		except BadJSON as e:
-			print(f'{author} returned {e}')
-			continue
-
-		posts.extend(sub_posts)
+	posts = get_reddit_posts_of_authors(authors, 0)
 
 	print(f'Load time for /all: {time.time() - start:.2f}')
 
-	return render(request, 'detail.html', { 'posts': sort_posts(posts) })
+	# The page is as old as its least recently synced author
+	synced_at = min((author.synced_at for author in authors if author.synced_at is not None), default=None)
+
+	return render(request, 'detail.html', { 'posts': posts, 'synced_at': synced_at })
 
 
 # Takes a story id and returns posts for it
@@ -59,17 +57,24 @@ def get_list_of_subscription_posts(request, story_id):
 	story = get_object_or_404(Story, pk=story_id)
 	author = get_object_or_404(Author, pk=story.author.id)
 
+	posts = get_reddit_posts(author, story, int(request.GET.get('n', 3)))
+	# get_reddit_posts() just synced the author
+	index = get_chapter_index(story, refresh=False)
+
 	return render(request, 'detail.html', {
 		'story': story,
 		'author': author,
-		'posts': get_reddit_posts(author, story, int(request.GET.get('n', 3)))
+		'posts': posts,
+		'synced_at': author.synced_at,
+		'gaps': describe_gaps(index.gaps()),
+		'duplicates': sorted(index.duplicates()),
 	})
 
 
 # Implements reddit style voting, returns a fake file with a name saying what action was taken
 @require_http_methods(["GET", "POST"])
 def vote(_, vote_id):
-	reddit = praw.Reddit()
+	reddit = get_reddit()
 	post = reddit.submission(vote_id)
 
 	wipe_cache(post.id)
@@ -80,18 +85,25 @@ def vote(_, vote_id):
 		if upvote_state is None:
 			post.upvote()
 			action = 'upvoted'
+			changes = {'likes': True}
 		elif upvote_state:  # is True
 			post.clear_vote()
 			action = 'downvoted'
+			changes = {'likes': None}
 		else:
 			raise NotImplemented()
 	else:
 		if post.hidden:
 			post.unhide()
 			action = 'unhidden'
+			changes = {'hidden': False}
 		else:
 			post.hide()
 			action = 'hidden'
+			changes = {'hidden': True}
+
+	# Keep the local post store in line with reddit, so the page shows the new state right away
+	Post.objects.filter(pk=vote_id).update(**changes)
 
 	# Return fake file download with so that we don't redirect the user
 	# Slightly annoying for desktop users, but suuuper handy for Kindle users
@@ -106,8 +118,13 @@ def vote(_, vote_id):
 # Takes in a reddit post id and returns an ebook for it
 @require_http_methods(["GET"])
 def download_ebook(_, post_id):
-	reddit = praw.Reddit()
-	post = [ reddit.submission(post_id) ]
+	stored = Post.objects.filter(pk=post_id).select_related('author').first()
+
+	if stored is not None:
+		post = [ stored ]
+	else:
+		reddit = get_reddit()
+		post = [ get_or_set_cache(reddit.submission(post_id)) ]
 
 	title = get_ebook_name_from_list_of_posts(post)
 
@@ -137,13 +154,8 @@ def bookify(request):
 	if 'list' not in p:
 		raise NotImplementedError()
 
-	posts = []
-	reddit = praw.Reddit()
-
 	# Lines in form post data is split with \r for some reason, not \n or \r\n, odd
-	for line in p['list'].split('\r'):
-		s = reddit.submission(url=line.strip())
-		posts.append(s)
+	posts = get_or_set_cache_many(get_submission_ids_from_urls(p['list'].split('\r')))
 
 	if len(posts) == 0:
 		raise NotImplementedError('cannot handle empty book')
@@ -153,6 +165,15 @@ def bookify(request):
 	return get_posts_as_ebook(posts, title, posts[0].author)
 
 
+# How busy the ebook converter and the post cache are, as JSON
+@require_http_methods(["GET"])
+def status(_):
+	return JsonResponse({
+		'converter': get_converter_stats(),
+		'post_cache': get_cache_stats(),
+	})
+
+
 @require_http_methods(["GET"])
 def get_all_authors(request):
 	authors = Author.ordered_objects.all()
@@ -179,37 +200,59 @@ def get_all_authors(request):
 
 # Takes in a story id and if there are unread posts, it returns up to 10 of them
 # If there are no unread posts for the story, then it makes a book with all the posts
+# With `first` and `last` it makes a book of those chapters instead, e.g. chapters 40 to 60
 @require_http_methods(["POST"])
-def get_n_chapter_as_ebook(_, story_id):
+def get_n_chapter_as_ebook(request, story_id):
 	story = get_object_or_404(Story, pk=story_id)
 	author = get_object_or_404(Author, pk=story.author.id)
 
-	posts = get_reddit_posts(author, story, 0)
+	if request.POST.get('first') and request.POST.get('last'):
+		try:
+			first = float(request.POST['first'])
+			last = float(request.POST['last'])
+		except ValueError:
+			return HttpResponseBadRequest('first and last have to be chapter numbers')
+
+		if not math.isfinite(first) or not math.isfinite(last) or first > last:
+			return HttpResponseBadRequest('first and last have to be chapter numbers, first no higher than last')
 
-	# We only want the oldest, unread, 10 posts.
-	posts = posts[-10:]
+		posts = get_chapter_index(story).chapters(first, last)
+
+		if len(posts) == 0:
+			return HttpResponseBadRequest(f'{story} has no chapters {first:g} to {last:g}')
+	else:
+		index = get_chapter_index(story)
+
+		# We only want the oldest, unread, 10 posts.
+		posts = index.next_unread(10, newest_read(story, index))
+
+		# Surprising behavior? If everything is already upvoted, get all posts instead?
+		if len(posts) == 0:
+			print('# GOING TO GET ALL POSTS BECAUSE posts was empty')
+			posts = index.posts
 
-	# Surprising behavior? If everything is already upvoted, get all posts instead?
 	if len(posts) == 0:
-		print('# GOING TO GET ALL POSTS BECAUSE posts was empty')
-		posts = get_reddit_posts(story.author, story, 10000)
+		raise NotImplementedError('cannot handle empty book')
 
+	posts = attach_read_state(list(posts))
 	title = get_ebook_name_from_list_of_posts(posts)
 
-	return get_posts_as_ebook(reversed(posts), title, author)
+	return get_posts_as_ebook(posts, title, author)
 
 @require_http_methods(["POST"])
 def nuke_cache(_, story_id=None):
 	if story_id is None:
 		print(f'Nuking THE WHOLE cache for ALL stories')
-		cache.clear()
+		invalidate_all()
+		# Every author gets crawled again the next time it is viewed
+		Author.ordered_objects.update(synced_at=None)
 		return redirect('index')
 
 	story = get_object_or_404(Story, pk=story_id)
-	posts = get_reddit_posts(story.author, story, 10000)
 
-	for post in posts:
-		print(f'Nuking cache for {post.title}')
-		utils.wipe_cache(post)
+	print(f'Nuking cache for {story}')
+	invalidate_story(story)
+	# The author gets crawled again the next time it is viewed
+	Author.ordered_objects.filter(pk=story.author_id).update(synced_at=None)
 
 	return redirect('detail', story_id=story_id)